@@ -3,12 +3,14 @@
 
 import random
 import json
-import re
+import codecs
 import operator
+from array import array
 
-from Mazes import Grid, DistanceGrid
+from Mazes import Grid, DistanceGrid, IndexedSet
 from PolarMazes import PolarGrid, mPolarGrid
 from randomKruskalMaze import randomKruskalMaze
+from compactGrid import CompactGrid, NORTH, EAST, SOUTH, WEST
 
 #maze algorithms
 MAZE_ALGORITHMS = dict()
@@ -19,10 +21,36 @@ MAZE_ALGORITHMS["RB"] = "Recursive Backtracker"
 MAZE_ALGORITHMS["S"] = "Sidewinder"
 MAZE_ALGORITHMS["W"] = "Wilson"
 
+# algorithms that only work on grids of rows and columns (not polar)
+RECTANGULAR_ALGORITHMS = ("BT", "S")
+
 MAZE_ALGORITHMS_DESC = []
 for a in MAZE_ALGORITHMS.keys():
     MAZE_ALGORITHMS_DESC.append("%s=%s" % (a, MAZE_ALGORITHMS[a]))
 
+#grid classes a saved maze may name, key is the class name
+GRID_CLASSES = dict()
+
+def registerGridClass(gridClass, name=None):
+    if name is None:
+        name = gridClass.__name__
+    GRID_CLASSES[name] = gridClass
+    return gridClass
+
+for gridClass in (Grid, DistanceGrid, PolarGrid, mPolarGrid, randomKruskalMaze, CompactGrid):
+    registerGridClass(gridClass)
+
+def gridClassFromHeader(classText):
+    """ grid class of a json header, written as str(type(grid)) like
+    "<class 'randomKruskalMaze.randomKruskalMaze'>" or as a plain name """
+    if classText.startswith("<class"):
+        classText = classText.split("'")[1]
+    className = classText.rsplit(".", 1)[-1]
+    try:
+        return GRID_CLASSES[className]
+    except KeyError:
+        raise ValueError("unknown grid class %r" % className)
+
 """This routine is keep for processing json file
 written by the previous version of mazes"""
 
@@ -30,10 +58,8 @@ def oldInitMazeFromJson(jsonFileName):
     f = open(jsonFileName, "r", encoding="utf-8")
     jsonObj = f.readline()
     thisNode = json.loads(jsonObj)
-    className = re.search(r"(\.)(\w+)(\')", thisNode[0]).group(2)
+    c = gridClassFromHeader(thisNode[0])
     params = thisNode[1]
-    g = globals()
-    c = g[className]
     grid = c(*params)
     row = operator.itemgetter(0)
     col = operator.itemgetter(1)
@@ -64,171 +90,355 @@ def oldInitMazeFromJson(jsonFileName):
     f.close()
     return grid
 
-def initMazeFromJson(jsonFileName):
-    f = open(jsonFileName, "r", encoding="utf-8")
-    jsonObj = f.readline()
-    thisNode = json.loads(jsonObj)
-    className = re.search(r"(\.)(\w+)(\')", thisNode[0]).group(2)
-    params = thisNode[1]
-    g = globals()
-    c = g[className]
-    grid = c(*params)
-    row = operator.itemgetter(0)
-    col = operator.itemgetter(1)
-    jsonObj = f.readline()
-    while jsonObj:
-        thisRecord = json.loads(jsonObj)
-        thisObj = thisRecord[0]
-        cell = grid.grid[row(thisObj)][col(thisObj)]
-        thisLinks = thisRecord[1]
-        keys = list(thisLinks.keys())
-        for i in keys:
-            thisNeighbor = thisLinks[i]
-            cellNeighbor = grid.grid[row(thisNeighbor)][col(thisNeighbor)]
-            cell.link(cellNeighbor, bidi=False)
-        if len(thisRecord) > 3:
-            cell.attributes = dict(thisRecord[2])
-        jsonObj = f.readline()
-    f.close()
+def _lineChunks(f, chunkSize):
+    """ lists of the lines in f, read chunkSize bytes or characters at a
+    time, f may be a text or binary file or a mmap """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    rest = ""
+    while True:
+        data = f.read(chunkSize)
+        if not data:
+            break
+        if not isinstance(data, str):
+            data = decoder.decode(data)
+        lines = (rest + data).split("\n")
+        rest = lines.pop()
+        yield lines
+    rest = rest + decoder.decode(b"", final=True)
+    if rest.strip():
+        yield [rest]
+
+def loadMazeJson(source, chunkSize=1 << 20):
+    """ grid from a json file written by dumpGrid
+
+    source is a file name, or any object with read() such as an open
+    text or binary file or a mmap.  Records are parsed a chunk at a
+    time with one json.loads per chunk and the links filled in with
+    grid.loadCellRecords. """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            return loadMazeJson(f, chunkSize)
+    grid = None
+    for lines in _lineChunks(source, chunkSize):
+        lines = [line for line in lines if line.strip()]
+        if grid is None:
+            if not lines:
+                continue
+            thisNode = json.loads(lines.pop(0))
+            grid = gridClassFromHeader(thisNode[0])(*thisNode[1])
+        if lines:
+            grid.loadCellRecords(json.loads("[" + ",".join(lines) + "]"))
+    if grid is None:
+        raise ValueError("no maze header found")
     return grid
 
+def initMazeFromJson(jsonFileName):
+    return loadMazeJson(jsonFileName)
 
-def initMaze(grid, algorithm):
+
+def initMaze(grid, algorithm, rng=None):
+    """ rng, for every generator, is a random.Random like object (or
+    mazeRandom.BulkRandom), the module random functions when None """
     if algorithm == "AB":
-        grid = initAldousBroderMaze(grid)
+        grid = initAldousBroderMaze(grid, rng)
     if algorithm == "BT":
-        grid = initBinaryTreeMaze(grid)
+        grid = initBinaryTreeMaze(grid, rng)
     if algorithm == "RB":
-        grid = initRecursiveBacktrackerMaze(grid)
+        grid = initRecursiveBacktrackerMaze(grid, rng)
     if algorithm == "S":
-        grid = initSidewinderMaze(grid)
+        grid = initSidewinderMaze(grid, rng)
     if algorithm == "W":
-        grid = initWilsonMaze(grid)
+        grid = initWilsonMaze(grid, rng)
     if algorithm == "HK":
-        grid = initHuntAndKillMaze(grid)
+        grid = initHuntAndKillMaze(grid, rng=rng)
 
     grid.algorithm = MAZE_ALGORITHMS[algorithm]
 
     return grid
 
-def getRandomMaze(grid):
-    algorithm = random.choice(list(MAZE_ALGORITHMS.keys()))
-    return initMaze(grid, algorithm)
-
-def initBinaryTreeMaze(grid):
-    for cell in grid.eachCell():
-        neighbors = []
-        if cell.nearby.get('north'):
-            neighbors.append(cell.nearby('north'))
-        if cell.nearby.get('east'):
-            neighbors.append(cell.nearby('east'))
-        if len(neighbors) > 0:
-            if len(neighbors) == 1:
-                ind = 0
-            else:
-                ind = random.randint(0, len(neighbors)-1)
-            neighbor = neighbors[ind]
-            if neighbor:
-                cell.link(neighbor)
+def getRandomMaze(grid, rng=None):
+    if rng is None:
+        rng = random
+    algorithm = rng.choice(list(MAZE_ALGORITHMS.keys()))
+    return initMaze(grid, algorithm, rng)
+
+def _uniforms(rng, size):
+    """ NumPy array of size uniforms in [0, 1) drawn in bulk from rng """
+    import numpy as np
+    if hasattr(rng, "uniforms"):
+        return rng.uniforms(size)
+    return np.random.default_rng(rng.getrandbits(64)).random(size)
+
+
+def _rectangularShape(grid, algorithm):
+    if not hasattr(grid, "columns"):
+        raise ValueError("%s needs a rectangular grid" % algorithm)
+    return grid.rows, grid.columns
+
+
+def _writeLinks(grid, north, east):
+    """ link every cell where north (east) is True to its north (east)
+    neighbor, north and east are (rows, columns) bool arrays """
+    import numpy as np
+    if hasattr(grid, "linkBits"):
+        bits = north * np.uint8(NORTH)
+        bits |= east * np.uint8(EAST)
+        bits[:-1] |= north[1:] * np.uint8(SOUTH)
+        bits[:, 1:] |= east[:, :-1] * np.uint8(WEST)
+        old = np.frombuffer(grid.linkBits, dtype=np.uint8).reshape(bits.shape)
+        grid.linkBits[:] = (bits | old).tobytes()
+        grid.linksChanged()
+        return
+    for row, column in zip(*(a.tolist() for a in np.nonzero(north))):
+        grid.grid[row][column].link(grid.grid[row - 1][column])
+    for row, column in zip(*(a.tolist() for a in np.nonzero(east))):
+        grid.grid[row][column].link(grid.grid[row][column + 1])
+
+
+def initBinaryTreeMaze(grid, rng=None):
+    """ every cell links north or east with even odds, the cells of the
+    top row east and of the east column north, all cells at once """
+    if rng is None:
+        rng = random
+    rows, columns = _rectangularShape(grid, "Binary Tree")
+    north = _uniforms(rng, rows * columns).reshape(rows, columns) < 0.5
+    north[:, -1] = True
+    north[0] = False
+    east = ~north
+    east[:, -1] = False
+    _writeLinks(grid, north, east)
     return grid
 
 
-def initRecursiveBacktrackerMaze(grid):
-    stack = []
-    stack.append(grid.randomCell())
-
-    while len(stack) > 0:
-        current = stack[-1]
-        neighbors = []
-        for n in current.neighbors():
-            if len(n.getLinks()) == 0:
-                neighbors.append(n)
+def initRecursiveBacktrackerMaze(grid, rng=None):
+    """ recursive backtracker over flat cell indices, with a preallocated
+    int array stack, a visited bitmap and a count of unvisited neighbors
+    per cell so finished cells are popped without a neighbor scan.
+    Makes the same maze as the cell by cell walk for the same random
+    state.  A CompactGrid is walked by index arithmetic straight into
+    its link bits, in about 6 bytes a cell besides the grid. """
+    if rng is None:
+        rng = random
+    if hasattr(grid, "linkBits"):
+        return _compactBacktracker(grid, rng)
+    index = grid.indexOf
+    cells = list(grid.eachCell())
+    neighbors = [[index(n) for n in cell.neighbors()] for cell in cells]
+    n = len(cells)
+    visited = bytearray(n)
+    unvisitedCount = bytearray(len(nb) for nb in neighbors)
+    stack = array('i', bytes(4 * n))
+    randrange = rng.randrange
+
+    def visit(i):
+        visited[i] = 1
+        for k in neighbors[i]:
+            unvisitedCount[k] -= 1
+
+    top = 0
+    stack[0] = index(grid.randomCell(rng))
+    visit(stack[0])
+    while top >= 0:
+        i = stack[top]
+        if not unvisitedCount[i]:
+            top = top - 1
+            continue
+        choices = [k for k in neighbors[i] if not visited[k]]
+        k = choices[randrange(len(choices))]
+        cells[i].link(cells[k])
+        visit(k)
+        top = top + 1
+        stack[top] = k
+    return grid
 
-        if len(neighbors) == 0:
-            stack.pop()
-        else:
-            neighbor = random.choice(neighbors)
-            current.link(neighbor)
-            stack.append(neighbor)
 
+def _compactBacktracker(grid, rng):
+    """ initRecursiveBacktrackerMaze for a CompactGrid """
+    linkBits = grid.linkBits
+    grid.linksChanged()        # the link bits are written directly
+    columns = grid.columns
+    n = len(linkBits)
+    visited = bytearray(n)
+    # unvisited neighbors of every cell, 4 less the grid edges it is on
+    unvisitedCount = bytearray([4]) * n
+    for i in range(columns):
+        unvisitedCount[i] -= 1
+        unvisitedCount[n - columns + i] -= 1
+    for i in range(0, n, columns):
+        unvisitedCount[i] -= 1
+        unvisitedCount[i + columns - 1] -= 1
+    stack = array('i', bytes(4 * n))
+    randrange = rng.randrange
+
+    def visit(i):
+        visited[i] = 1
+        column = i % columns
+        if i >= columns:
+            unvisitedCount[i - columns] -= 1
+        if column + 1 < columns:
+            unvisitedCount[i + 1] -= 1
+        if i + columns < n:
+            unvisitedCount[i + columns] -= 1
+        if column:
+            unvisitedCount[i - 1] -= 1
+
+    top = 0
+    stack[0] = grid.indexOf(grid.randomCell(rng))
+    visit(stack[0])
+    while top >= 0:
+        i = stack[top]
+        if not unvisitedCount[i]:
+            top = top - 1
+            continue
+        column = i % columns
+        choices = []
+        if i >= columns and not visited[i - columns]:
+            choices.append((i - columns, NORTH, SOUTH))
+        if column + 1 < columns and not visited[i + 1]:
+            choices.append((i + 1, EAST, WEST))
+        if i + columns < n and not visited[i + columns]:
+            choices.append((i + columns, SOUTH, NORTH))
+        if column and not visited[i - 1]:
+            choices.append((i - 1, WEST, EAST))
+        k, bit, back = choices[randrange(len(choices))]
+        linkBits[i] |= bit
+        linkBits[k] |= back
+        visit(k)
+        top = top + 1
+        stack[top] = k
     return grid
 
-def initSidewinderMaze(grid):
-    tf = [True, False]
-    for row in grid.eachRow():
-        run = []
-        for cell in row:
-            run.append(cell)
-            at_eastern_boundary = (cell.nearby.get('east') is None)
-            at_northern_boundary = (cell.nearby.get('north') is None)
-            #note: ruby: 0  ==  True
-            should_close_out = at_eastern_boundary or (at_northern_boundary is False
-                                                       and random.choice(tf) is True)
-            if should_close_out is True:
-                member = random.choice(run)
-                if member.nearby.get('north'):
-                    member.link(member.nearby('north'))
-                run = []
-            else:
-                cell.link(cell.nearby('east'))
+def initSidewinderMaze(grid, rng=None):
+    """ each row is cut into runs of cells linked east, a run closes at
+    the east wall or on a coin toss (never in the top row) and one random
+    cell of it links north.  The runs of the whole grid are found at once
+    from the positions of the closing cells. """
+    import numpy as np
+    if rng is None:
+        rng = random
+    rows, columns = _rectangularShape(grid, "Sidewinder")
+    closeOut = _uniforms(rng, rows * columns).reshape(rows, columns) < 0.5
+    closeOut[:, -1] = True
+    closeOut[0] = False
+    closeOut[0, -1] = True
+    ends = np.flatnonzero(closeOut)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    members = starts + (_uniforms(rng, len(ends)) * (ends - starts + 1)).astype(np.int64)
+    north = np.zeros(rows * columns, dtype=bool)
+    north[members[members >= columns]] = True
+    _writeLinks(grid, north.reshape(rows, columns), ~closeOut)
     return grid
 
-def initAldousBroderMaze(grid):
-    cell = grid.randomCell()
+def initAldousBroderMaze(grid, rng=None):
+    if rng is None:
+        rng = random
+    cell = grid.randomCell(rng)
     unvisited = grid.size()-1
     while unvisited > 0:
-        neighbor = random.choice(cell.neighbors())
+        neighbor = rng.choice(cell.neighbors())
         if len(neighbor.getLinks()) == 0:#isempty
             cell.link(neighbor)
             unvisited = unvisited-1
         cell = neighbor
     return grid
 
-def initWilsonMaze(grid):
-    unvisited = []
-    for cell in grid.eachCell():
-        unvisited.append(cell)
+def initWilsonMaze(grid, rng=None):
+    if rng is None:
+        rng = random
+    unvisited = IndexedSet(grid.eachCell())
+    index = grid.indexOf
+    # position of each cell in the current walk, -1 when not on it
+    pathPosition = [-1] * len(unvisited)
 
-    first = random.choice(unvisited)
+    first = rng.choice(unvisited.items)
     unvisited.remove(first)
 
     while len(unvisited) > 0:
-        cell = random.choice(unvisited)
+        cell = rng.choice(unvisited.items)
         path = [cell]
+        pathPosition[index(cell)] = 0
         while cell in unvisited:
-            cell = random.choice(cell.neighbors())
-            if cell in path:
-                position = path.index(cell)
-                #in Ruby code: path = path[0..position]
-                #is in Python needs the line below
-                path = path[:position+1]
+            cell = rng.choice(cell.neighbors())
+            position = pathPosition[index(cell)]
+            if position >= 0:
+                # erase the loop, keep path[0..position]
+                for loopCell in path[position+1:]:
+                    pathPosition[index(loopCell)] = -1
+                del path[position+1:]
             else:
+                pathPosition[index(cell)] = len(path)
                 path.append(cell)
-        #in Ryby: 0.upto(path.length-2)
-        #is in Python the line below
         for i in range(len(path)-1):
             path[i].link(path[i+1])
             unvisited.remove(path[i])
+        for pathCell in path:
+            pathPosition[index(pathCell)] = -1
 
     return grid
 
-def initHuntAndKillMaze(grid):
-    currentCell = grid.randomCell()
+def initHuntAndKillMaze(grid, hunt="scan", rng=None):
+    """ hunt="scan" hunts in row order like the classic algorithm (same
+    maze for the same seed) but never rescans rows already completed,
+    hunt="frontier" picks a random cell from a kept frontier of unvisited
+    cells next to the visited region """
+    if hunt not in ("scan", "frontier"):
+        raise ValueError("unknown hunt mode %r" % hunt)
+    if rng is None:
+        rng = random
+    index = grid.indexOf
+    rows = list(grid.eachRow())
+    unvisitedInRow = [len(row) for row in rows]
+    visited = bytearray(sum(unvisitedInRow))
+    frontier = IndexedSet()
+    cursor = 0      # rows before cursor have no unvisited cells
+
+    def visit(cell):
+        visited[index(cell)] = 1
+        unvisitedInRow[cell.row] -= 1
+        if hunt == "frontier":
+            frontier.discard(cell)
+            for n in cell.neighbors():
+                if not visited[index(n)]:
+                    frontier.add(n)
+
+    currentCell = grid.randomCell(rng)
+    visit(currentCell)
 
     while currentCell != None:
-        unvisitedNeighbors = [n for n in currentCell.neighbors() if len(n.getLinks()) == 0]
+        unvisitedNeighbors = [n for n in currentCell.neighbors() if not visited[index(n)]]
         if len(unvisitedNeighbors) > 0:
-            neighbor = random.choice(unvisitedNeighbors)
+            neighbor = rng.choice(unvisitedNeighbors)
             currentCell.link(neighbor)
+            visit(neighbor)
             currentCell = neighbor
+        elif hunt == "frontier":
+            currentCell = None
+            if len(frontier) > 0:
+                currentCell = rng.choice(frontier.items)
+                visitedNeighbors = [n for n in currentCell.neighbors() if visited[index(n)]]
+                currentCell.link(rng.choice(visitedNeighbors))
+                visit(currentCell)
         else:
             currentCell = None
-            for cell in grid.eachCell():
-                visitedNeighbors = [n for n in cell.neighbors() if len(n.getLinks()) != 0]
-                if len(cell.getLinks()) == 0 and len(visitedNeighbors) != 0:
-                    currentCell = cell
-                    neighbor = random.choice(visitedNeighbors)
-                    currentCell.link(neighbor)
+            while cursor < len(rows) and unvisitedInRow[cursor] == 0:
+                cursor = cursor + 1
+            for r in range(cursor, len(rows)):
+                if unvisitedInRow[r] == 0:
+                    continue
+                row = rows[r]
+                for cell in row:
+                    if visited[index(cell)]:
+                        continue
+                    visitedNeighbors = [n for n in cell.neighbors() if visited[index(n)]]
+                    if len(visitedNeighbors) != 0:
+                        currentCell = cell
+                        neighbor = rng.choice(visitedNeighbors)
+                        currentCell.link(neighbor)
+                        visit(currentCell)
+                        break
+                if currentCell is not None:
                     break
 
     return grid
@@ -236,16 +446,9 @@ def initHuntAndKillMaze(grid):
 
 # ===========================================================
 
-def initRecursiveBacktrackerMaze2(grid):
-    rbWalkFrom(grid.randomCell())
-    return grid
-
-def rbWalkFrom(cell):
-    shuffledNeighbors = random.sample(cell.neighbors(), len(cell.neighbors()))
-    for neighbor in shuffledNeighbors:
-        if len(neighbor.getLinks()) == 0:
-            cell.link(neighbor)
-            rbWalkFrom(neighbor)
+def initRecursiveBacktrackerMaze2(grid, rng=None):
+    """ the recursive walk is now the stack safe initRecursiveBacktrackerMaze """
+    return initRecursiveBacktrackerMaze(grid, rng)
 
 def printGrid(grid):
     print("%s Maze" % grid.algorithm)
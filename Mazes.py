@@ -59,7 +59,10 @@ import json
 import re
 import operator
 from distances import Distances
-import cairo
+try:
+    import cairo
+except ImportError:     # cairo is only needed for cairo drawing
+    cairo = None
 
 __version__ = 0.5
 
@@ -69,8 +72,48 @@ COPYRIGHT = "(C) 2017 Douglas Lange"
 
 
 
+class IndexedSet:
+    """ set with O(1) add, remove, membership and uniform random choice,
+    removal swaps the last item into the hole """
+
+    def __init__(self, items=()):
+        self.items = []
+        self.position = dict()
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.position:
+            self.position[item] = len(self.items)
+            self.items.append(item)
+
+    def remove(self, item):
+        i = self.position.pop(item)
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.position[last] = i
+
+    def discard(self, item):
+        if item in self.position:
+            self.remove(item)
+
+    def __contains__(self, item):
+        return item in self.position
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
 class Cell:
     """ one cell of a rectangular grid of cells """
+
+    tunnelWeighted = False    # True if a tunnel link counts the cells it spans
+    myGrid = None             # grid of the cell, set by Grid.configureCells
+
     def __init__(self, row, column):
         self.row = row
         self.column = column
@@ -95,6 +138,11 @@ class Cell:
 
     def link(self, cell, bidi=True):
         self.links[cell] = True
+        grid = self.myGrid
+        if grid is not None:
+            grid.revision += 1
+            if grid.deadEndSet is not None:
+                grid.updateDeadEnd(self)
         if bidi is True:
             cell.link(self, False)
         return self
@@ -104,6 +152,11 @@ class Cell:
             del self.links[cell]
         except KeyError:
             pass
+        grid = self.myGrid
+        if grid is not None:
+            grid.revision += 1
+            if grid.deadEndSet is not None:
+                grid.updateDeadEnd(self)
         if bidi:
             cell.unlink(self, False)
         return self
@@ -137,31 +190,41 @@ class Cell:
         if self.links.get(myNeighbor):
             return myNeighbor
 
-    def fillCell(self, ctx, pointsPerCell, hue):
+    def fillRect(self, pointsPerCell):
+        """ (x, y, width, height) filled by fillCell """
         yU = self.row*pointsPerCell+4
         xL = self.column*pointsPerCell+4
-        ctx.rectangle(xL, yU, pointsPerCell, pointsPerCell)
+        return (xL, yU, pointsPerCell, pointsPerCell)
+
+    def fillCell(self, ctx, pointsPerCell, hue):
+        ctx.rectangle(*self.fillRect(pointsPerCell))
 #       evenodd = (self.row+self.column) % 2
         ctx.set_source_rgb(*hue)
         ctx.fill()
 
-    def drawCell(self, ctx, pointsPerCell, rows, columns):
+    def wallSegments(self, pointsPerCell, rows, columns):
+        """ (x0, y0, x1, y1) wall lines stroked by drawCell """
         yU = self.row*pointsPerCell+4
         yL = yU+pointsPerCell
         xL = self.column*pointsPerCell+4
         xR = xL+pointsPerCell
-        ctx.set_source_rgb(0, 0, 0)
-        ctx.set_line_width(4.0)
+        segments = []
         if not(self.hasNeighbor("east")) and self.column < (columns-1):
-            ctx.move_to(xR, yU-2)
-            ctx.line_to(xR, yL+2)
-            ctx.stroke()
+            segments.append((xR, yU-2, xR, yL+2))
         if not(self.hasNeighbor("south")) and self.row < (rows-1):
-            ctx.move_to(xL, yL)
-            ctx.line_to(xR, yL)
+            segments.append((xL, yL, xR, yL))
+        return segments
+
+    def drawCell(self, ctx, pointsPerCell, rows, columns):
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.set_line_width(4.0)
+        for x0, y0, x1, y1 in self.wallSegments(pointsPerCell, rows, columns):
+            ctx.move_to(x0, y0)
+            ctx.line_to(x1, y1)
             ctx.stroke()
 
-    def insetDrawCell(self, ctx, pointsPerCell):
+    def insetWallSegments(self, pointsPerCell):
+        """ (x0, y0, x1, y1) wall lines stroked by insetDrawCell """
         yU = self.row*pointsPerCell+4
         yL = yU+pointsPerCell
         xL = self.column*pointsPerCell+4
@@ -170,40 +233,33 @@ class Cell:
         yLi = yL-3
         xLi = xL+3
         xRi = xR-3
-        ctx.set_source_rgb(0, 0, 0)
-        ctx.set_line_width(4.0)
+        segments = []
         if not self.hasNeighbor("east"):
-            ctx.move_to(xRi, yUi-2)
-            ctx.line_to(xRi, yLi+2)
-            ctx.stroke()
+            segments.append((xRi, yUi-2, xRi, yLi+2))
         if not self.hasNeighbor("west"):
-            ctx.move_to(xLi, yUi-2)
-            ctx.line_to(xLi, yLi+2)
-            ctx.stroke()
+            segments.append((xLi, yUi-2, xLi, yLi+2))
         if self.hasNeighbor("east") or self.attributes.get("EWpassage"):
-            ctx.move_to(xRi-2, yUi)
-            ctx.line_to(xLi+pointsPerCell+2, yUi)
-            ctx.stroke()
-            ctx.move_to(xRi-2, yLi)
-            ctx.line_to(xLi+pointsPerCell+2, yLi)
-            ctx.stroke()
+            segments.append((xRi-2, yUi, xLi+pointsPerCell+2, yUi))
+            segments.append((xRi-2, yLi, xLi+pointsPerCell+2, yLi))
         if not self.hasNeighbor("south"):
-            ctx.move_to(xLi, yLi)
-            ctx.line_to(xRi, yLi)
-            ctx.stroke()
+            segments.append((xLi, yLi, xRi, yLi))
         if not self.hasNeighbor("north"):
-            ctx.move_to(xLi, yUi)
-            ctx.line_to(xRi, yUi)
-            ctx.stroke()
+            segments.append((xLi, yUi, xRi, yUi))
         if self.hasNeighbor("south") or self.attributes.get("NSpassage"):
-            ctx.move_to(xLi, yLi-2)
-            ctx.line_to(xLi, yUi+pointsPerCell+2)
-            ctx.stroke()
-            ctx.move_to(xRi, yLi-2)
-            ctx.line_to(xRi, yUi+pointsPerCell+2)
+            segments.append((xLi, yLi-2, xLi, yUi+pointsPerCell+2))
+            segments.append((xRi, yLi-2, xRi, yUi+pointsPerCell+2))
+        return segments
+
+    def insetDrawCell(self, ctx, pointsPerCell):
+        ctx.set_source_rgb(0, 0, 0)
+        ctx.set_line_width(4.0)
+        for x0, y0, x1, y1 in self.insetWallSegments(pointsPerCell):
+            ctx.move_to(x0, y0)
+            ctx.line_to(x1, y1)
             ctx.stroke()
 
-    def insetFillCell(self, ctx, pointsPerCell, hue = [1,1,1]):
+    def insetFillRects(self, pointsPerCell):
+        """ (x, y, width, height) rectangles filled by insetFillCell """
         yU = self.row*pointsPerCell+4
         yL = yU+pointsPerCell
         xL = self.column*pointsPerCell+4
@@ -212,45 +268,42 @@ class Cell:
         yLi = yL-3
         xLi = xL+3
         xRi = xR-3
-        ctx.set_source_rgb(*hue)
-        ctx.rectangle(xLi, yUi, pointsPerCell-6, pointsPerCell-6)
-        ctx.fill()
+        rects = [(xLi, yUi, pointsPerCell-6, pointsPerCell-6)]
         if self.hasNeighbor("east"):
             east = self.getNeighbor("east")
             tunnelEast = east.column - self.column - 1
             if tunnelEast:
-                ctx.rectangle(xRi, yUi, 6, pointsPerCell-6)
-                ctx.fill()
+                rects.append((xRi, yUi, 6, pointsPerCell-6))
             else:
-                ctx.rectangle(xRi, yUi, 3, pointsPerCell-6)
-                ctx.fill()
+                rects.append((xRi, yUi, 3, pointsPerCell-6))
         if self.hasNeighbor("south"):
             south = self.getNeighbor("south")
             tunnelSouth = south.row - self.row - 1
             if tunnelSouth:
-                ctx.rectangle(xLi, yLi, pointsPerCell-6, 6)
-                ctx.fill()
+                rects.append((xLi, yLi, pointsPerCell-6, 6))
             else:
-                ctx.rectangle(xLi, yLi, pointsPerCell-6, 3)
-                ctx.fill()
+                rects.append((xLi, yLi, pointsPerCell-6, 3))
         if self.hasNeighbor("west"):
             west = self.getNeighbor("west")
             tunnelWest = self.column - west.column - 1
             if tunnelWest:
-                ctx.rectangle(xL-3, yUi, 6, pointsPerCell-6)
-                ctx.fill()
+                rects.append((xL-3, yUi, 6, pointsPerCell-6))
             else:
-                ctx.rectangle(xL, yUi, 3, pointsPerCell-6)
-                ctx.fill()
+                rects.append((xL, yUi, 3, pointsPerCell-6))
         if self.hasNeighbor("north"):
             north = self.getNeighbor("north")
             tunnelNorth = self.row - north.row - 1
             if tunnelNorth:
-                ctx.rectangle(xLi, yU-3, pointsPerCell-6, 6)
-                ctx.fill()
+                rects.append((xLi, yU-3, pointsPerCell-6, 6))
             else:
-                ctx.rectangle(xLi, yU, pointsPerCell-6, 3)
-                ctx.fill()
+                rects.append((xLi, yU, pointsPerCell-6, 3))
+        return rects
+
+    def insetFillCell(self, ctx, pointsPerCell, hue = [1,1,1]):
+        ctx.set_source_rgb(*hue)
+        for rect in self.insetFillRects(pointsPerCell):
+            ctx.rectangle(*rect)
+            ctx.fill()
 
     def hasNeighbor(self, direction):
         direction = self.directionToText(direction)
@@ -259,6 +312,10 @@ class Cell:
 
     #return Distances from this cell to all other cells
     def getDistances(self, pallet=0):
+        """ distances from this cell, from the grid's DistanceCache when
+        the cell belongs to a grid """
+        if self.myGrid is not None:
+            return self.myGrid.distanceField(self, pallet)
         distances = Distances(self, rootPallet=pallet)
         frontier = []
         frontier.append(self)
@@ -309,6 +366,53 @@ class Cell:
 
 
 
+def mergeSegments(segments):
+    """ join horizontal and vertical segments lying on one line that touch
+    or overlap into single segments, other segments are kept as they are """
+    horizontal = dict()
+    vertical = dict()
+    merged = []
+    for x0, y0, x1, y1 in segments:
+        if y0 == y1:
+            horizontal.setdefault(y0, []).append((min(x0, x1), max(x0, x1)))
+        elif x0 == x1:
+            vertical.setdefault(x0, []).append((min(y0, y1), max(y0, y1)))
+        else:
+            merged.append((x0, y0, x1, y1))
+    for lines, horizontalLine in ((horizontal, True), (vertical, False)):
+        for at in sorted(lines):
+            runs = sorted(lines[at])
+            start, end = runs[0]
+            for a, b in runs[1:]:
+                if a <= end:
+                    end = max(end, b)
+                else:
+                    merged.append((start, at, end, at) if horizontalLine else (at, start, at, end))
+                    start, end = a, b
+            merged.append((start, at, end, at) if horizontalLine else (at, start, at, end))
+    return merged
+
+
+def strokeSegments(ctx, segments, width=4.0):
+    """ stroke all segments in black as one path """
+    ctx.set_source_rgb(0, 0, 0)
+    ctx.set_line_width(width)
+    for x0, y0, x1, y1 in segments:
+        ctx.move_to(x0, y0)
+        ctx.line_to(x1, y1)
+    ctx.stroke()
+
+
+def fillRectangles(ctx, rectsByHue):
+    """ one path and one fill for each hue, rectsByHue maps an rgb tuple
+    to its list of (x, y, width, height) """
+    for hue, rects in rectsByHue.items():
+        ctx.set_source_rgb(*hue)
+        for rect in rects:
+            ctx.rectangle(*rect)
+        ctx.fill()
+
+
 class Grid:
 
     def __init__(self, rows, columns, cellClass=Cell):
@@ -325,6 +429,9 @@ class Grid:
         self.deadends = None           # pallet for maze dead ends
         self.ctx = None
         self.coloring = None
+        self.deadEndSet = None         # IndexedSet of dead ends, see deadEndIndex()
+        self.revision = 0              # moved on every change of the links
+        self.distanceCache = None      # see getDistanceCache()
 
     def prepareGrid(self):
         rowList = []
@@ -341,6 +448,7 @@ class Grid:
         for cell in self.eachCell():
             row = cell.row
             col = cell.column
+            cell.myGrid = self
             cell.nearby['north'] = self.getNeighbor(row-1, col)
             cell.nearby['east'] = self.getNeighbor(row, col+1)
             cell.nearby['south'] = self.getNeighbor(row+1, col)
@@ -358,22 +466,34 @@ class Grid:
     def listDeadends(self):
 #    def listDeadends(self,filename):
 #        fh = open(fileName, "w", encoding="utf8")
-        for cell in self.eachCell():
-            if len(cell.links) == 1: # if a deadend
-                deadend = cell
-                pathcell = deadend
-                d = self.distances.cells.get(pathcell, 0)
-                while d > 0:
-                    for neighbor in pathcell.getLinks():
-                        n = self.distances.cells.get(neighbor, 0)
-                        if n < d:
-                            pathcell = neighbor
-                            d = n
-                            break
-                print("Deadend ", deadend, pathcell)
-                        
+        for deadend, pathcell, length in self.branchDecomposition().deadEndBranches():
+            print("Deadend ", deadend, pathcell)
+
+
+    def writeSVG(self, filename, inset=False, compress=False, openings=()):
+        """ draw like drawGrid (insetDrawGrid if inset) without cairo into
+        filename.SVG, or gzipped into filename.SVGZ """
+        import svgWriter
+        drawFile = filename + (".SVGZ" if compress else ".SVG")
+        svgWriter.writeGridSVG(self, drawFile, inset=inset, compress=compress,
+                               openings=openings)
+
+    def drawPNG(self, filename, inset=False):
+        """ raster picture like drawGrid (insetDrawGrid if inset) in
+        filename.PNG, drawn with NumPy for mazes too big for SVG """
+        import rasterRender
+        img = rasterRender.rasterizeGrid(self, inset=inset)
+        rasterRender.writePNG(img, filename + ".PNG")
+
+    def drawTiles(self, filename, tileSize=256, inset=False):
+        """ Deep Zoom pyramid of PNG tiles, filename.dzi and filename_files/,
+        drawn one band of rows at a time for poster size mazes """
+        import tiledRender
+        return tiledRender.renderDeepZoom(self, filename, tileSize=tileSize, inset=inset)
 
     def drawGrid(self, filename):
+        if cairo is None:
+            return self.writeSVG(filename)
         WIDTH, HEIGHT = self.columns*self.pointsPerCell+8, self.rows*self.pointsPerCell+8
         drawFile = filename + ".SVG"
         surface = cairo.SVGSurface(drawFile, WIDTH, HEIGHT)
@@ -383,14 +503,16 @@ class Grid:
         self.ctx.set_line_join(cairo.LINE_JOIN_MITER)
         self.ctx.stroke()
         if self.coloring is not None:
-            for row in self.grid:
-                for cell in row:
-                    d = self.distances.cells.get(cell, 0)
-                    hue = self.coloring.cellRGB(d, cell)
-                    cell.fillCell(self.ctx, self.pointsPerCell, hue)
-        for row in self.grid:
-            for cell in row:
-                cell.drawCell(self.ctx, self.pointsPerCell, self.rows, self.columns)
+            fills = dict()
+            for cell in self.eachCell():
+                d = self.distances.cells.get(cell, 0)
+                hue = self.coloring.cellRGB(d, cell)
+                fills.setdefault(tuple(hue), []).append(cell.fillRect(self.pointsPerCell))
+            fillRectangles(self.ctx, fills)
+        walls = []
+        for cell in self.eachCell():
+            walls.extend(cell.wallSegments(self.pointsPerCell, self.rows, self.columns))
+        strokeSegments(self.ctx, mergeSegments(walls))
         self.ctx.set_source_rgb(0, 0, 0)
         self.ctx.set_line_width(4)
         self.ctx.set_line_join(cairo.LINE_JOIN_MITER)
@@ -398,6 +520,8 @@ class Grid:
         self.ctx.stroke()
 
     def insetDrawGrid(self, filename):
+        if cairo is None:
+            return self.writeSVG(filename, inset=True)
         WIDTH, HEIGHT = self.columns*self.pointsPerCell+8, self.rows*self.pointsPerCell+8
         drawFile = filename + ".SVG"
         surface = cairo.SVGSurface(drawFile, WIDTH, HEIGHT)
@@ -408,22 +532,18 @@ class Grid:
         self.ctx.set_line_join(cairo.LINE_JOIN_MITER)
         self.ctx.rectangle(4, 4, self.columns*self.pointsPerCell, self.rows*self.pointsPerCell)
         self.ctx.fill()
-        if self.coloring is not None:
-            for row in self.grid:
-                for cell in row:
-                    d = self.distances.cells.get(cell, 0)
-#                    c = int(d/2)
-#                    if c > 8:
-#                        c = 8
-                    hue = self.coloring.cellRGB(d, cell)
-                    cell.insetFillCell(self.ctx, self.pointsPerCell, hue)
-        else:
-            for row in self.grid:
-                for cell in row:
-                    cell.insetFillCell(self.ctx, self.pointsPerCell)
-        for row in self.grid:
-            for cell in row:
-                cell.insetDrawCell(self.ctx, self.pointsPerCell)
+        fills = dict()
+        walls = []
+        for cell in self.eachCell():
+            if self.coloring is not None:
+                d = self.distances.cells.get(cell, 0)
+                hue = tuple(self.coloring.cellRGB(d, cell))
+            else:
+                hue = (1, 1, 1)
+            fills.setdefault(hue, []).extend(cell.insetFillRects(self.pointsPerCell))
+            walls.extend(cell.insetWallSegments(self.pointsPerCell))
+        fillRectangles(self.ctx, fills)
+        strokeSegments(self.ctx, mergeSegments(walls))
 
     def drawOpening(self,cell):
         """ for now just support left and right opennings """
@@ -446,14 +566,43 @@ class Grid:
                              (4-2+(cell.row+1)*self.pointsPerCell))
             self.ctx.stroke()
 
+    def initParameters(self):
+        """ __init__ parameters recreating an empty grid like this one """
+        return [self.rows, self.columns]
+
     def dumpGrid(self, filename):
-        thisObj = [str(type(self)), [self.rows, self.columns]]
+        thisObj = [str(type(self)), self.initParameters()]
         jsonObj = json.dumps(thisObj)
         print(jsonObj, file=filename)
         for row in self.grid:
             for cell in row:
                 cell.dumpCell(filename)
 
+    def loadCellRecords(self, records):
+        """ restore links and attributes from dumpCell records
+        [[row, column], {direction: [row, column]}, attributes]
+        straight into the cells, records hold both ends of every link """
+        grid = self.grid
+        for record in records:
+            row, column = record[0]
+            cell = grid[row][column]
+            links = cell.links
+            nearby = cell.nearby
+            for direction, location in record[1].items():
+                neighbor = grid[location[0]][location[1]]
+                links[neighbor] = True
+                if nearby.get(direction) is not neighbor:
+                    nearby[direction] = neighbor      # tunnel of a weave maze
+            if len(record) > 2 and record[2]:
+                cell.attributes = dict(record[2])
+                if record[2].get("NSpassage"):
+                    nearby['north'] = None
+                    nearby['south'] = None
+                if record[2].get("EWpassage"):
+                    nearby['east'] = None
+                    nearby['west'] = None
+        self.linksChanged()
+
     def getCell(self, row, column):
 
         return self.grid[row][column]
@@ -469,44 +618,79 @@ class Grid:
     def size(self):
         return self.rows*self.columns
 
-    def randomCell(self):
-        row = random.randint(0, self.rows-1)
+    def indexOf(self, cell):
+        """ flat integer index of cell, row major """
+        return cell.row*self.columns + cell.column
+
+    def cellAt(self, index):
+        """ cell at flat integer index, inverse of indexOf """
+        row, column = divmod(index, self.columns)
+        return self.grid[row][column]
+
+    def randomCell(self, rng=None):
+        if rng is None:
+            rng = random
+        row = rng.randint(0, self.rows-1)
 #        column = self.grid
-        column = random.randint(0, len(self.grid[row])-1)
+        column = rng.randint(0, len(self.grid[row])-1)
         return self.grid[row][column]
 
     def contentsOf(self, cell):
         return "   "
 
+    def linksChanged(self):
+        """ call after writing links without Cell.link, drops the dead
+        end index and the cached distance fields """
+        self.revision += 1
+        self.deadEndSet = None
+
+    def getDistanceCache(self, budget=None):
+        """ the grid's arrayDistances.DistanceCache, budget in bytes """
+        import arrayDistances
+        if self.distanceCache is None:
+            self.distanceCache = arrayDistances.DistanceCache(
+                self, arrayDistances.DEFAULT_CACHE_BUDGET if budget is None else budget)
+        elif budget is not None:
+            self.distanceCache.setBudget(budget)
+        return self.distanceCache
+
+    def deadEndIndex(self):
+        """ IndexedSet of the dead end cells (one link), built by one scan
+        on first use and then kept up to date by Cell.link and unlink """
+        if self.deadEndSet is None:
+            self.deadEndSet = IndexedSet(cell for cell in self.eachCell()
+                                         if len(cell.links) == 1)
+        return self.deadEndSet
+
+    def updateDeadEnd(self, cell):
+        if len(cell.links) == 1:
+            self.deadEndSet.add(cell)
+        else:
+            self.deadEndSet.discard(cell)
+
+    def isDeadEnd(self, cell):
+        return cell in self.deadEndIndex()
+
     def getDeadEndCells(self):
-        deadends = []
-        for cell in self.eachCell():
-            if len(cell.getLinks()) == 1:
-                deadends.append(cell)
-        return deadends
+        return list(self.deadEndIndex())
 
-    def braid(self, p=1.0):
+    def braid(self, p=1.0, rng=None):
+        if rng is None:
+            rng = random
         deadends = self.getDeadEndCells()
-        random.shuffle(deadends)
-        j = len(deadends)
-        for i in range(j):
-            cell = deadends[i]
-            myNeighbors = cell.neighbors()
-            myLinks = cell.getLinks()
-            possibleLinks = []
-            if len(myLinks) == 1 and random.random() <= p:
-                for n in myNeighbors:
-                    if n not in myLinks:
-                        possibleLinks.append(n)
-                otherDeadEnds = list(filter(lambda x: len(x.getLinks()) == 1, possibleLinks))
+        rng.shuffle(deadends)
+        isDeadEnd = self.isDeadEnd
+        for cell in deadends:
+            if isDeadEnd(cell) and rng.random() <= p:
+                possibleLinks = [n for n in cell.neighbors() if not cell.linked(n)]
+                if not possibleLinks:
+                    continue
+                otherDeadEnds = [n for n in possibleLinks if isDeadEnd(n)]
                 if len(otherDeadEnds):
-                    l =random.choice(otherDeadEnds)
+                    l =rng.choice(otherDeadEnds)
                 else:
-                    l = random.choice(possibleLinks)
+                    l = rng.choice(possibleLinks)
                 cell.link(l)
-        
-
-        
 
     def __str__(self):
         return self.asciiStr()
@@ -540,48 +724,116 @@ class Grid:
             output = output+bottom+"\n"
         return output
 
-    def getDistancesFromPath(self, start, goal, pallet=0):
-        distancesToStart = start.getDistances(pallet)
-        distancesToGoal = goal.getDistances(pallet)
+    def getDistancesFromPath(self, start, goal, pallet=0, fields=None):
+        """ path length through every cell less the shortest path length,
+        fields is (start field, goal field) as returned by findDiameter
+        to skip computing them again """
+        if fields is None:
+            distancesFromStart = self.distanceField(start, pallet)
+            distancesToGoal = self.distanceField(goal, pallet)
+        else:
+            distancesFromStart, distancesToGoal = fields
         pathLength = distancesToGoal.getDistanceTo(start)
-        sumDistances = distancesToStart + distancesToGoal
-        return (sumDistances - pathLength)
-
-    def getMaxFractalDistances(self):
-        fractalDistances = Distances(None)
-        for lrow in self.grid:
-            for cell in lrow:
-                box = []
-                fd = 0
-                r = cell.row
-                c = cell.column
-                if (c - 1) >= 0 :
-                    box.append(self.grid[r][c-1])
-                if (r - 1) >= 0 :
-                    box.append(self.grid[r-1][c])
-                if (c + 1) < self.columns :
-                    box.append(self.grid[r][c+1])
-                if (r + 1) < self.rows :
-                    box.append(self.grid[r+1][c])
-                distancesInBox = cell.getDistancesInBox(box)
-                if (c - 1) >= 0 :
-                    d = distancesInBox.getDistanceTo(self.grid[r][c-1])
-                    if d > fd:
-                        fd = d
-                if (r - 1) >= 0 :
-                    d = distancesInBox.getDistanceTo(self.grid[r -1 ][c])
-                    if d > fd:
-                        fd = d
-                if (c + 1) < self.columns :
-                    d = distancesInBox.getDistanceTo(self.grid[r][c+1])
-                    if d > fd:
-                        fd = d
-                if (r + 1) <  self.rows :
-                    d = distancesInBox.getDistanceTo(self.grid[r+1][c])
-                    if d > fd:
-                        fd = d
-                fractalDistances.setDistanceTo(cell, fd)
-        return fractalDistances
+        sumDistances = distancesFromStart + distancesToGoal
+        sumDistances -= pathLength
+        return sumDistances
+
+    def borderMask(self):
+        """ bool array by cell index, True for the cells on the edge """
+        import numpy as np
+        row, column = np.divmod(np.arange(self.rows * self.columns), self.columns)
+        return ((row == 0) | (row == self.rows - 1) |
+                (column == 0) | (column == self.columns - 1))
+
+    def findDiameter(self, border=False, weighted=None, pallet=0):
+        """ set start and goal to the two ends of the longest path of the
+        maze, found by two breadth first passes (exact for a perfect maze);
+        with border only cells on the edge are considered.  A third pass
+        makes the field from the goal.  Returns the fields from start and
+        goal, to hand to getDistancesFromPath as fields """
+        import numpy as np
+        import arrayDistances
+        if weighted is None:
+            weighted = self.cellAt(0).tunnelWeighted
+        cache = self.getDistanceCache()
+        candidates = self.borderMask() if border else None
+
+        def field(source):
+            return cache.field(source, weighted)
+
+        def farthest(dist):
+            d = np.where(dist == arrayDistances.UNREACHED, -1, dist)
+            if candidates is not None:
+                d[~candidates] = -1
+            return int(np.argmax(d))
+
+        first = int(np.flatnonzero(candidates)[0]) if border else 0
+        a = farthest(field(first))
+        fromStart = field(a)
+        b = farthest(fromStart)
+        self.start = self.cellAt(a)
+        self.goal = self.cellAt(b)
+        return (arrayDistances.ArrayDistances(self.start, self, fromStart, rootPallet=pallet),
+                arrayDistances.ArrayDistances(self.goal, self, field(b), rootPallet=pallet))
+
+    def csrAdjacency(self, weighted=False):
+        """ links as CSR arrays (indptr, indices, weights) by cell index """
+        import arrayDistances
+        return arrayDistances.csrFromLinks(self, weighted)
+
+    def distanceField(self, cell, pallet=0, weighted=None, csr=None):
+        """ like cell.getDistances(pallet) but computed by the NumPy
+        engine, returns an ArrayDistances, fields are kept in the grid's
+        DistanceCache unless csr is given """
+        import arrayDistances
+        if weighted is None:
+            weighted = cell.tunnelWeighted
+        if csr is None:
+            dist = self.getDistanceCache().field(self.indexOf(cell), weighted)
+        else:
+            indptr, indices, weights = csr
+            dist = arrayDistances.bfsDistances(indptr, indices, self.indexOf(cell),
+                                               weights if weighted else None)
+        return arrayDistances.ArrayDistances(cell, self, dist, rootPallet=pallet)
+
+    def getMultiSourceDistances(self, sources):
+        """ one breadth first pass from several (cell, pallet) sources,
+        each cell gets the distance to its nearest source and that
+        source's pallet, tie-breaking as chained Distances.minP """
+        import arrayDistances
+        indptr, indices, _ = self.getDistanceCache().adjacency()
+        dist, pallet = arrayDistances.multiSourceDistances(
+            indptr, indices, [self.indexOf(c) for c, p in sources],
+            [p for c, p in sources])
+        return arrayDistances.ArrayDistances(sources[0][0], self, dist,
+                                             rootPallet=sources[0][1],
+                                             palletArray=pallet)
+
+    def branchDecomposition(self, distances=None):
+        """ arrayDistances.BranchDecomposition of the dead end branches off
+        the main path, the cells at distance 0 of distances (by default
+        self.distances as made by getDistancesFromPath) """
+        import arrayDistances
+        import numpy as np
+        if distances is None:
+            distances = self.distances
+        indptr, indices, _ = self.getDistanceCache().adjacency()
+        if hasattr(distances, "distanceArray"):
+            onPath = distances.distanceArray == 0
+        else:
+            onPath = np.zeros(len(indptr) - 1, dtype=bool)
+            for cell, d in distances.cells.items():
+                if d == 0:
+                    onPath[self.indexOf(cell)] = True
+        return arrayDistances.BranchDecomposition(self, indptr, indices, onPath)
+
+    def getMaxFractalDistances(self, radius=None, workers=1):
+        """ for each cell the largest path distance to its adjacent cells,
+        searches stop at radius links (cells needing more are left out
+        of the result), workers > 1 spreads chunks over processes """
+        import arrayDistances
+        fd = self.getDistanceCache().fractal(radius, workers)
+        return arrayDistances.ArrayDistances(None, self, fd)
 
 
 class DistanceGrid(Grid):
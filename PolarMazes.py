@@ -6,8 +6,13 @@
 
 import math
 import json
+import bisect
+import random
 import Mazes
-import cairo
+try:
+    import cairo
+except ImportError:     # cairo is only needed for cairo drawing
+    cairo = None
 
 class PolarCell(Mazes.Cell):
 
@@ -18,15 +23,17 @@ class PolarCell(Mazes.Cell):
         self.directions = ('in', 'cw', 'outcw', 'out', 'outccw', 'ccw')
         self.nearby = dict()      # key is direction (i.e. 'east') value is cell object
         self.links = dict()       #
+        self.attributes = dict()
 
     def fillCell(self, ctx, pointsPerCell, rows, columns, center, hue):
-        incAngle = 2 * math.pi * (1 / columns)
-        startAngle = self.column * incAngle
-        endAngle = startAngle + incAngle
-        radiusI = (self.row + self.myGrid.radiusRow1) * pointsPerCell
-        radiusO = radiusI + pointsPerCell
-        ctx.move_to(center + (radiusI * math.cos(endAngle)),
-                    center + (radiusI * math.sin(endAngle)))
+        geometry = self.myGrid.geometry(pointsPerCell)
+        angles = geometry.angles[self.row]
+        startAngle = angles[self.column]
+        endAngle = angles[self.column + 1]
+        radiusI = geometry.radii[self.row]
+        radiusO = geometry.radii[self.row + 1]
+        ctx.move_to(center + (radiusI * geometry.cos[self.row][self.column + 1]),
+                    center + (radiusI * geometry.sin[self.row][self.column + 1]))
         ctx.new_path()
         ctx.arc_negative(center, center, radiusI, endAngle, startAngle)
         ctx.arc(center, center, radiusO, startAngle, endAngle)
@@ -36,21 +43,24 @@ class PolarCell(Mazes.Cell):
         ctx.fill()
 
     def drawCell(self, ctx, pointsPerCell, rows, columns, center):
-        incAngle = 2 * math.pi * (1 / columns)
-        startAngle = self.column * incAngle
-        endAngle = startAngle + incAngle
-        midAngle = startAngle + (incAngle / 2)
-        radiusI = (self.row + self.myGrid.radiusRow1) * pointsPerCell 
-        radiusO = radiusI + pointsPerCell 
+        geometry = self.myGrid.geometry(pointsPerCell)
+        angles = geometry.angles[self.row]
+        startAngle = angles[self.column]
+        endAngle = angles[self.column + 1]
+        midAngle = geometry.midAngles[self.row][self.column]
+        radiusI = geometry.radii[self.row]
+        radiusO = geometry.radii[self.row + 1]
         ctx.new_path()
         ctx.set_source_rgb(0, 0, 0)
         ctx.set_line_width(4.0)
         if not self.hasNeighbor("cw"):
+            cosEnd = geometry.cos[self.row][self.column + 1]
+            sinEnd = geometry.sin[self.row][self.column + 1]
             ctx.set_line_cap(cairo.LINE_CAP_BUTT)
-            ctx.move_to(center + ((radiusI -2) * math.cos(endAngle)),
-                        center + ((radiusI -2) * math.sin(endAngle)))
-            ctx.line_to(center + ((radiusO +2) * math.cos(endAngle)),
-                        center + ((radiusO +2) * math.sin(endAngle)))
+            ctx.move_to(center + ((radiusI -2) * cosEnd),
+                        center + ((radiusI -2) * sinEnd))
+            ctx.line_to(center + ((radiusO +2) * cosEnd),
+                        center + ((radiusO +2) * sinEnd))
             ctx.stroke()
         if self.row < (rows-1):
             #
@@ -80,6 +90,37 @@ class PolarCell(Mazes.Cell):
                     ctx.stroke()
 
 
+class PolarGeometry:
+    """ radii of every ring and angles of every column boundary of a
+    PolarGrid at one pointsPerCell, with their cos and sin, so drawing
+    does no trigonometry per cell.  Rows with the same number of columns
+    share their angle lists. """
+
+    def __init__(self, grid, pointsPerCell=None):
+        ppc = grid.pointsPerCell if pointsPerCell is None else pointsPerCell
+        self.pointsPerCell = ppc
+        self.center = (grid.radiusRow1 + grid.rows) * ppc + 4
+        self.radii = [(row + grid.radiusRow1) * ppc for row in range(grid.rows + 1)]
+        self.angles = []
+        self.midAngles = []
+        self.cos = []
+        self.sin = []
+        byColumns = dict()
+        for columns in grid.columnsPerRow:
+            if columns not in byColumns:
+                incAngle = 2 * math.pi * (1 / columns)
+                angles = [c * incAngle for c in range(columns + 1)]
+                byColumns[columns] = (angles,
+                                      [a + (incAngle / 2) for a in angles[:-1]],
+                                      [math.cos(a) for a in angles],
+                                      [math.sin(a) for a in angles])
+            angles, midAngles, cos, sin = byColumns[columns]
+            self.angles.append(angles)
+            self.midAngles.append(midAngles)
+            self.cos.append(cos)
+            self.sin.append(sin)
+
+
 class PolarGrid(Mazes.Grid):
     
     def __init__(self, radiusRow1, rows, columnsRow1, cellClass=PolarCell):
@@ -97,6 +138,10 @@ class PolarGrid(Mazes.Grid):
         self.goal = []                 # cell of path goal
         self.background = None         # pallet for background
         self.deadends = None           # pallet for maze dead ends
+        self.polarGeometry = None      # PolarGeometry cache, see geometry()
+        self.deadEndSet = None         # IndexedSet of dead ends, see deadEndIndex()
+        self.revision = 0              # moved on every change of the links
+        self.distanceCache = None      # see getDistanceCache()
 
     def prepareGrid(self):
         columns = self.columnsRow1
@@ -104,6 +149,7 @@ class PolarGrid(Mazes.Grid):
         if doubleRow == 0:
             doubleRow = 2
         rowList = []
+        self.rowOffsets = [0]     # flat index of the first cell of each row
         i = 0
         j = 0
         for i in range(self.rows):
@@ -112,11 +158,11 @@ class PolarGrid(Mazes.Grid):
                 columns = 2 * columns
                 doubleRow = 2 * doubleRow
             self.columnsPerRow.append(columns)
+            self.rowOffsets.append(self.rowOffsets[-1] + columns)
             columnList = []
             for j in range(columns):
                 columnList.append(self.CellClass(i, j))
             rowList.append(columnList)
-        print(self.columnsPerRow)
         return rowList
 
 
@@ -152,8 +198,21 @@ class PolarGrid(Mazes.Grid):
                 cell.nearby['out'] = self.getNeighbor(row+1, colnrow)
             cell.nearby['ccw'] = self.getNeighbor(row, col-1)
 
+    def initParameters(self):
+        return [self.radiusRow1, self.rows, self.columnsRow1]
+
+    def geometry(self, pointsPerCell=None):
+        """ PolarGeometry of the grid at pointsPerCell (by default the
+        grid's), rebuilt when pointsPerCell changes """
+        if pointsPerCell is None:
+            pointsPerCell = self.pointsPerCell
+        if (self.polarGeometry is None or
+                self.polarGeometry.pointsPerCell != pointsPerCell):
+            self.polarGeometry = PolarGeometry(self, pointsPerCell)
+        return self.polarGeometry
+
     def dumpGrid(self, filename):
-        thisObj = [str(type(self)), [self.radiusRow1, self.rows, self.columnsRow1]]
+        thisObj = [str(type(self)), self.initParameters()]
         jsonObj = json.dumps(thisObj)
         print(jsonObj, file=filename)
         for row in self.grid:
@@ -175,14 +234,38 @@ class PolarGrid(Mazes.Grid):
         return self.grid[row][column]
 
     def size(self):
-        return self.rows*self.columns
+        return self.rowOffsets[-1]
+
+    def borderMask(self):
+        """ bool array by cell index, True for the cells of the inner and
+        outer rings, where drawOpening can open the maze """
+        import numpy as np
+        mask = np.zeros(self.rowOffsets[-1], dtype=bool)
+        mask[:self.rowOffsets[1]] = True
+        mask[self.rowOffsets[-2]:] = True
+        return mask
+
+    def randomCell(self, rng=None):
+        """ uniform over all cells, rows have different numbers of cells """
+        if rng is None:
+            rng = random
+        return self.cellAt(rng.randrange(self.rowOffsets[-1]))
+
+    def indexOf(self, cell):
+        return self.rowOffsets[cell.row] + cell.column
+
+    def cellAt(self, index):
+        row = bisect.bisect_right(self.rowOffsets, index) - 1
+        return self.grid[row][index - self.rowOffsets[row]]
 
 
 
     def drawGrid(self, filename):
         sizeDrawing = 2*(self.radiusRow1 + self.rows) * self.pointsPerCell + 9
-        center = (self.radiusRow1 + self.rows) * self.pointsPerCell + 4
+        center = self.geometry().center
         drawFile = filename + ".SVG"
+        if cairo is None:
+            raise ImportError("pycairo is needed to draw polar mazes")
         surface = cairo.SVGSurface(drawFile, sizeDrawing, sizeDrawing)
         self.ctx = cairo.Context(surface)
         self.ctx.set_line_join(cairo.LINE_JOIN_MITER)
@@ -190,10 +273,10 @@ class PolarGrid(Mazes.Grid):
         self.ctx.set_line_join(cairo.LINE_JOIN_MITER)
         self.ctx.stroke()
         if self.background is not None:
+            norm = math.sqrt(4*self.rows**2)
             for row in self.grid:
                 for cell in row:
                     d = self.distances.cells.get(cell, 0)
-                    norm = math.sqrt(4*self.rows**2)
                     c = int(d * 3 / norm) +2
                     if c > 7:
                         c = 7
@@ -226,23 +309,23 @@ class PolarGrid(Mazes.Grid):
         self.ctx.stroke()
 
     def drawOpening(self, cell):
-        center = (self.radiusRow1 + self.rows) * self.pointsPerCell +4
-        incAngle = 2 * math.pi * (1 / self.columnsPerRow[cell.row])
-        startAngle = cell.column * incAngle
-        endAngle = startAngle + incAngle
+        geometry = self.geometry()
+        center = geometry.center
+        startAngle = geometry.angles[cell.row][cell.column]
+        endAngle = geometry.angles[cell.row][cell.column + 1]
         if self.background is None:
             hue = (1, 1, 1)
         else:
             hue = self.background[1]
         self.ctx.set_source_rgb(*hue)
-        radius = (cell.row + cell.myGrid.radiusRow1) * self.pointsPerCell
+        radius = geometry.radii[cell.row]
         if cell.row == 0:
             deltaA = 2/radius
             self.ctx.arc(center, center, radius,
                          startAngle + deltaA, endAngle - deltaA)
             self.ctx.stroke()
         if cell.row == self.rows - 1:
-            radius = radius + self.pointsPerCell
+            radius = geometry.radii[cell.row + 1]
             deltaA = 2/radius
             self.ctx.arc(center, center, radius,
                          startAngle + deltaA, endAngle - deltaA)
@@ -264,12 +347,18 @@ class mPolarGrid(PolarGrid):
         self.goal = []                 # cell of path goal
         self.background = None         # pallet for background
         self.deadends = None           # pallet for maze dead ends
+        self.polarGeometry = None      # PolarGeometry cache, see geometry()
+        self.deadEndSet = None         # IndexedSet of dead ends, see deadEndIndex()
+        self.revision = 0              # moved on every change of the links
+        self.distanceCache = None      # see getDistanceCache()
         self.pallets = []
 
     def drawGrid(self, filename):
         sizeDrawing = 2*(self.radiusRow1 + self.rows) * self.pointsPerCell + 9
-        center = (self.radiusRow1 + self.rows) * self.pointsPerCell + 4
+        center = self.geometry().center
         drawFile = filename + ".SVG"
+        if cairo is None:
+            raise ImportError("pycairo is needed to draw polar mazes")
         surface = cairo.SVGSurface(drawFile, sizeDrawing, sizeDrawing)
         self.ctx = cairo.Context(surface)
         self.ctx.set_line_join(cairo.LINE_JOIN_MITER)
@@ -308,23 +397,23 @@ class mPolarGrid(PolarGrid):
         self.ctx.stroke()
 
     def drawOpening(self, cell):
-        center = (self.radiusRow1 + self.rows) * self.pointsPerCell +4
-        incAngle = 2 * math.pi * (1 / self.columnsPerRow[cell.row])
-        startAngle = cell.column * incAngle
-        endAngle = startAngle + incAngle
+        geometry = self.geometry()
+        center = geometry.center
+        startAngle = geometry.angles[cell.row][cell.column]
+        endAngle = geometry.angles[cell.row][cell.column + 1]
         if self.background is None:
             hue = (1, 1, 1)
         else:
             hue = self.background[1]
         self.ctx.set_source_rgb(*hue)
-        radius = (cell.row + cell.myGrid.radiusRow1) * self.pointsPerCell
+        radius = geometry.radii[cell.row]
         if cell.row == 0:
             deltaA = 2/radius
             self.ctx.arc(center, center, radius,
                          startAngle + deltaA, endAngle - deltaA)
             self.ctx.stroke()
         if cell.row == self.rows - 1:
-            radius = radius + self.pointsPerCell
+            radius = geometry.radii[cell.row + 1]
             deltaA = 2/radius
             self.ctx.arc(center, center, radius,
                          startAngle + deltaA, endAngle - deltaA)
@@ -0,0 +1,592 @@
+""" NumPy backed distance engine
+
+(C) 2017 Douglas Lange
+
+Distance fields are computed as int32 arrays indexed by flat cell index
+(grid.indexOf) over a CSR (compressed sparse row) export of the grid
+links, see Grid.csrAdjacency.  Unreached cells hold UNREACHED, which is
+kept out of all arithmetic, so fields may go negative safely.
+
+ArrayDistances wraps such an array and behaves like a Distances object,
+its cells and pallet attributes are read only mappings from cell to
+value so renderers can keep calling distances.cells.get(cell, 0).
+
+DistanceCache keeps a grid's CSR export and recent fields between calls
+(Grid.getDistanceCache) until the links change.
+
+"""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+import numbers
+import numpy as np
+from distances import Distances
+
+UNREACHED = np.iinfo(np.int32).min
+DEFAULT_CACHE_BUDGET = 64 << 20     # bytes of arrays a DistanceCache keeps
+
+
+def csrFromLinks(grid, weighted=False):
+    """ CSR adjacency (indptr, indices, weights) built from cell.getLinks(),
+    weights are None unless weighted, then a tunnel counts the cells it
+    spans like kruskalCell.getDistances """
+    index = grid.indexOf
+    cells = list(grid.eachCell())
+    indptr = np.zeros(len(cells) + 1, dtype=np.int64)
+    indices = []
+    weights = []
+    for cell in cells:
+        links = cell.getLinks()
+        indptr[index(cell) + 1] = len(links)
+        for linked in links:
+            indices.append(index(linked))
+            if weighted:
+                weights.append(max(abs(cell.row - linked.row),
+                                   abs(cell.column - linked.column)))
+    # cells are visited in index order, so cumulative counts line up
+    np.cumsum(indptr, out=indptr)
+    indices = np.array(indices, dtype=np.int32)
+    if weighted:
+        return indptr, indices, np.array(weights, dtype=np.int32)
+    return indptr, indices, None
+
+
+def _expand(indptr, indices, frontier):
+    """ all (parent, neighbor, edge offset) of the cells in frontier """
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    ends = np.cumsum(counts)
+    offsets = np.repeat(starts - ends + counts, counts) + np.arange(total)
+    return np.repeat(frontier, counts), indices[offsets].astype(np.int64), offsets
+
+
+def bfsDistances(indptr, indices, source, weights=None):
+    """ distance from source to every cell as an int32 array
+
+    the search is breadth first by links; with weights a cell is given
+    the distance of the first frontier cell reaching it plus the edge
+    weight, exactly as kruskalCell.getDistances counts tunnels """
+    n = len(indptr) - 1
+    dist = np.full(n, UNREACHED, dtype=np.int32)
+    dist[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    level = 0
+    while frontier.size:
+        level = level + 1
+        parents, neighbors, offsets = _expand(indptr, indices, frontier)
+        new = dist[neighbors] == UNREACHED
+        neighbors = neighbors[new]
+        # keep the first discovery of every cell, in discovery order
+        _, first = np.unique(neighbors, return_index=True)
+        first.sort()
+        frontier = neighbors[first]
+        if weights is None:
+            dist[frontier] = level
+        else:
+            parents = parents[new][first]
+            dist[frontier] = dist[parents] + weights[offsets[new][first]]
+    return dist
+
+
+def _foldPallets(order, pallets):
+    """ pallet chosen by Distances.minP folded over tied sources in order """
+    current = pallets[order[0]]
+    for k in order[1:]:
+        if pallets[k] - current == 1:
+            current = pallets[k]
+    return current
+
+
+def multiSourceDistances(indptr, indices, sources, pallets):
+    """ distance to the nearest of several sources and its pallet, in one
+    breadth first pass
+
+    sources are cell indices and pallets their pallet ids.  The result
+    matches folding the single source fields with Distances.minP in
+    source order: of the sources at the minimum distance the first one
+    wins, and a later one takes over when its pallet is the current
+    pallet + 1.  The tied sources of every cell are kept as a bitmask,
+    so at most 64 sources are done in one pass.  Returns the int32
+    distance and pallet arrays. """
+    k = len(sources)
+    n = len(indptr) - 1
+    dist = np.full(n, UNREACHED, dtype=np.int32)
+    if k == 0:
+        return dist, np.zeros(n, dtype=np.int32)
+    if k > 64:
+        dist, pallet = multiSourceDistances(indptr, indices, sources[:64], pallets[:64])
+        for s, p in zip(sources[64:], pallets[64:]):
+            that = bfsDistances(indptr, indices, s)
+            take = (that != UNREACHED) & ((dist == UNREACHED) | (that < dist))
+            tie = (that == dist) & (that != UNREACHED) & ((p - pallet) == 1)
+            pallet = np.where(take | tie, p, pallet).astype(np.int32)
+            dist = np.where(take, that, dist).astype(np.int32)
+        return dist, pallet
+    tied = np.zeros(n, dtype=np.uint64)
+    for bit, s in enumerate(sources):
+        dist[s] = 0
+        tied[s] |= np.uint64(1) << np.uint64(bit)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    level = 0
+    while frontier.size:
+        level = level + 1
+        parents, neighbors, _ = _expand(indptr, indices, frontier)
+        new = dist[neighbors] == UNREACHED
+        parents = parents[new]
+        neighbors = neighbors[new]
+        np.bitwise_or.at(tied, neighbors, tied[parents])
+        frontier = np.unique(neighbors)
+        dist[frontier] = level
+    pallet = np.zeros(n, dtype=np.int32)
+    masks, inverse = np.unique(tied, return_inverse=True)
+    choice = np.zeros(len(masks), dtype=np.int32)
+    for i, mask in enumerate(masks):
+        mask = int(mask)
+        if mask:
+            order = [b for b in range(k) if mask >> b & 1]
+            choice[i] = _foldPallets(order, pallets)
+    pallet[:] = choice[inverse.ravel()]
+    return dist, pallet
+
+
+def fractalDistanceChunk(indptr, indices, rows, columns, start, stop, radius=None):
+    """ max fractal distance of the cells start .. stop-1 of a rectangular
+    grid: for every cell the largest path distance to one of its (up to
+    four) adjacent cells.  Each search stops once all of them are found
+    or at radius links, cells with a neighbor farther than radius get
+    UNREACHED.  indptr and indices may be lists for speed. """
+    out = np.full(stop - start, UNREACHED, dtype=np.int32)
+    size = rows * columns
+    for i in range(start, stop):
+        c = i % columns
+        targets = set()
+        if c > 0:
+            targets.add(i - 1)
+        if c < columns - 1:
+            targets.add(i + 1)
+        if i >= columns:
+            targets.add(i - columns)
+        if i + columns < size:
+            targets.add(i + columns)
+        remaining = len(targets)
+        seen = {i}
+        frontier = [i]
+        d = 0
+        fd = 0
+        while frontier and remaining and (radius is None or d < radius):
+            d = d + 1
+            newFrontier = []
+            for u in frontier:
+                for j in range(indptr[u], indptr[u+1]):
+                    v = indices[j]
+                    if v not in seen:
+                        seen.add(v)
+                        newFrontier.append(v)
+                        if v in targets:
+                            remaining = remaining - 1
+                            fd = d
+            frontier = newFrontier
+        if not remaining:
+            out[i - start] = fd
+    return out
+
+
+_fractalWorkerData = None     # set in pool worker processes only
+
+
+def _initFractalWorker(indptr, indices, rows, columns):
+    """ the arrays are sent to the worker, which keeps them as lists
+    (faster to index) until the pool shuts down """
+    global _fractalWorkerData
+    _fractalWorkerData = (indptr.tolist(), indices.tolist(), rows, columns)
+
+
+def _fractalWorkerChunk(task):
+    start, stop, radius = task
+    return fractalDistanceChunk(*_fractalWorkerData, start, stop, radius)
+
+
+def fractalDistances(indptr, indices, rows, columns, radius=None, workers=1,
+                     chunkSize=4096):
+    """ max fractal distance of every cell, see fractalDistanceChunk,
+    split in chunks of cells done by a pool of worker processes """
+    size = rows * columns
+    tasks = [(start, min(start + chunkSize, size), radius)
+             for start in range(0, size, chunkSize)]
+    if workers <= 1:
+        indptr, indices = indptr.tolist(), indices.tolist()
+        chunks = [fractalDistanceChunk(indptr, indices, rows, columns, start, stop, radius)
+                  for start, stop, radius in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_initFractalWorker,
+                                 initargs=(indptr, indices, rows, columns)) as pool:
+            chunks = list(pool.map(_fractalWorkerChunk, tasks))
+    if not chunks:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(chunks)
+
+
+def branchTree(indptr, indices, onPath):
+    """ breadth first forest grown from every main path cell at once
+
+    onPath is a bool array of the main path cells.  Returns int64 arrays
+    parent (-1 for path and unreached cells), depth (links from the main
+    path, -1 unreached), root (the first cell off the path of the branch
+    holding each cell, -1 on the path) and order (the cells off the path
+    in breadth first order) """
+    n = len(indptr) - 1
+    parent = np.full(n, -1, dtype=np.int64)
+    depth = np.full(n, -1, dtype=np.int64)
+    root = np.full(n, -1, dtype=np.int64)
+    frontier = np.flatnonzero(onPath).astype(np.int64)
+    depth[frontier] = 0
+    levels = []
+    level = 0
+    while frontier.size:
+        level = level + 1
+        parents, neighbors, _ = _expand(indptr, indices, frontier)
+        new = depth[neighbors] == -1
+        parents = parents[new]
+        neighbors = neighbors[new]
+        _, first = np.unique(neighbors, return_index=True)
+        first.sort()
+        frontier = neighbors[first]
+        parents = parents[first]
+        parent[frontier] = parents
+        depth[frontier] = level
+        root[frontier] = np.where(onPath[parents], frontier, root[parents])
+        levels.append(frontier)
+    order = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+    return parent, depth, root, order
+
+
+class BranchDecomposition:
+    """ the dead end branches hanging off the main path of a maze, found
+    in one breadth first pass from the path and one pass back up it
+
+    arrays are indexed by cell index:
+        parent        next cell toward the main path, -1 on the path
+        depth         links from the main path (branch length of a dead end)
+        branchId      0 .. branches-1 for cells off the path, -1 on it
+        subtreeSize   cells in the subtree of the cell, away from the path,
+                      itself included; a path cell counts the branches
+                      hanging off it
+        junction      main path cell the branch of the cell leaves from
+    deadEnds          indices of all dead ends in cell order, those on the
+                      path (usually start or goal) or unreached included
+    branchRoots       first cell of every branch, by branch id
+    """
+
+    def __init__(self, grid, indptr, indices, onPath):
+        self.grid = grid
+        parent, depth, root, order = branchTree(indptr, indices, onPath)
+        self.parent = parent
+        self.depth = depth
+        self.branchRoots = np.unique(root[order])
+        self.branchId = np.full(len(parent), -1, dtype=np.int64)
+        self.branchId[order] = np.searchsorted(self.branchRoots, root[order])
+        self.junction = np.full(len(parent), -1, dtype=np.int64)
+        self.junction[order] = parent[root[order]]
+        size = np.ones(len(parent), dtype=np.int64)
+        # children come after their parents in order, add back up by level
+        levelStarts = np.flatnonzero(np.diff(depth[order], prepend=0)) if len(order) else order
+        bounds = list(levelStarts) + [len(order)]
+        for a, b in reversed(list(zip(bounds[:-1], bounds[1:]))):
+            cells = order[a:b]
+            np.add.at(size, parent[cells], size[cells])
+        self.subtreeSize = size
+        degree = np.diff(indptr)
+        self.deadEnds = np.flatnonzero(degree == 1)
+
+    def branches(self):
+        return len(self.branchRoots)
+
+    def deadEndBranches(self):
+        """ (dead end cell, junction cell, branch length) of every dead end,
+        a dead end on the path is its own junction with length 0 """
+        cellAt = self.grid.cellAt
+        junction = np.where(self.junction[self.deadEnds] >= 0,
+                            self.junction[self.deadEnds], self.deadEnds)
+        length = np.maximum(self.depth[self.deadEnds], 0)
+        return [(cellAt(i), cellAt(j), d) for i, j, d in
+                zip(self.deadEnds.tolist(), junction.tolist(), length.tolist())]
+
+    def branchSizes(self):
+        """ cells in every branch, by branch id """
+        return self.subtreeSize[self.branchRoots]
+
+
+def _nbytes(value):
+    if isinstance(value, tuple):
+        return sum(a.nbytes for a in value if a is not None)
+    return value.nbytes
+
+
+def _readOnly(value):
+    for a in (value if isinstance(value, tuple) else (value,)):
+        if a is not None:
+            a.flags.writeable = False
+    return value
+
+
+class DistanceCache:
+    """ least recently used cache of the CSR adjacency and the distance
+    fields of one grid, holding at most budget bytes of arrays
+
+    fields are keyed by (source cell index, weighted), the pallet only
+    labels a field so ArrayDistances wrappers share one array.  All
+    entries are dropped when grid.revision has moved since they were
+    made, Cell.link and unlink (and so braid) move it.  Cached arrays
+    are read only, ArrayDistances copies one before changing it. """
+
+    def __init__(self, grid, budget=DEFAULT_CACHE_BUDGET):
+        self.grid = grid
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.revision = grid.revision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def setBudget(self, budget):
+        self.budget = budget
+        self._evict()
+
+    def _evict(self):
+        while self.bytes > self.budget and self.entries:
+            _, value = self.entries.popitem(last=False)
+            self.bytes -= _nbytes(value)
+            self.evictions += 1
+
+    def _get(self, key, make):
+        if self.grid.revision != self.revision:
+            if self.entries:
+                self.invalidations += 1
+            self.clear()
+            self.revision = self.grid.revision
+        value = self.entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+        self.misses += 1
+        value = _readOnly(make())
+        size = _nbytes(value)
+        if size <= self.budget:
+            self.entries[key] = value
+            self.bytes += size
+            self._evict()
+        return value
+
+    def adjacency(self, weighted=False):
+        """ grid.csrAdjacency(weighted) """
+        weighted = bool(weighted)
+        return self._get(("csr", weighted), lambda: self.grid.csrAdjacency(weighted))
+
+    def field(self, source, weighted=False):
+        """ int32 distance array from the cell with index source """
+        weighted = bool(weighted)
+
+        def make():
+            indptr, indices, weights = self.adjacency(weighted)
+            return bfsDistances(indptr, indices, source, weights if weighted else None)
+
+        return self._get(("field", source, weighted), make)
+
+    def fractal(self, radius=None, workers=1):
+        """ fractalDistances of the grid, workers only changes the speed """
+        def make():
+            indptr, indices, _ = self.adjacency()
+            return fractalDistances(indptr, indices, self.grid.rows, self.grid.columns,
+                                    radius=radius, workers=workers)
+
+        return self._get(("fractal", radius), make)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+                "entries": len(self.entries), "bytes": self.bytes,
+                "budget": self.budget}
+
+
+class _arrayView(Mapping):
+    """ read only cell -> value mapping over an array, UNREACHED cells
+    of the distance array are not part of the mapping """
+
+    def __init__(self, owner, values):
+        self.owner = owner
+        self.values = values
+
+    def __getitem__(self, cell):
+        if cell is None:
+            raise KeyError(cell)
+        i = self.owner.grid.indexOf(cell)
+        if self.owner.distanceArray[i] == UNREACHED:
+            raise KeyError(cell)
+        return int(self.values()[i])
+
+    def __contains__(self, cell):
+        if cell is None:
+            return False
+        return self.owner.distanceArray[self.owner.grid.indexOf(cell)] != UNREACHED
+
+    def __iter__(self):
+        cellAt = self.owner.grid.cellAt
+        for i in np.flatnonzero(self.owner.distanceArray != UNREACHED):
+            yield cellAt(int(i))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.owner.distanceArray != UNREACHED))
+
+
+class ArrayDistances(Distances):
+    """ Distances over a grid held in an int32 array indexed by cell index,
+    a read only array (shared from a DistanceCache) is copied on the
+    first change """
+
+    def __init__(self, rootCell, grid, distanceArray, rootPallet=0, palletArray=None):
+        self.rootCell = rootCell
+        self.grid = grid
+        self.distanceArray = distanceArray
+        self.rootPallet = rootPallet
+        self.palletArray = palletArray    # None means rootPallet everywhere
+        self.cells = _arrayView(self, lambda: self.distanceArray)
+        self.pallet = _arrayView(self, self.pallets)
+
+    def pallets(self):
+        """ pallet of every cell as an array """
+        if self.palletArray is None:
+            return np.full(len(self.distanceArray), self.rootPallet, dtype=np.int32)
+        return self.palletArray
+
+    def getDistanceTo(self, cell):
+        return self.cells.get(cell, None)
+
+    def _writable(self):
+        if not self.distanceArray.flags.writeable:
+            self.distanceArray = self.distanceArray.copy()
+        return self.distanceArray
+
+    def setDistanceTo(self, cell, distance):
+        self._writable()[self.grid.indexOf(cell)] = distance
+
+    def getPallet(self, cell):
+        return self.pallet.get(cell, None)
+
+    def setPallet(self, cell, thisPallet):
+        if self.palletArray is None:
+            if thisPallet == self.rootPallet:
+                return
+            self.palletArray = self.pallets()
+        self.palletArray[self.grid.indexOf(cell)] = thisPallet
+
+    def getCells(self):
+        return self.cells.keys()
+
+    def isPartOfPath(self, cell):
+        return cell in self.cells
+
+    def __len__(self):
+        return len(self.cells)
+
+    def reached(self):
+        """ boolean array, True for cells part of these distances """
+        return self.distanceArray != UNREACHED
+
+    def _otherArray(self, other):
+        """ distances of other by cell index, other may be any Distances """
+        if isinstance(other, ArrayDistances):
+            return other.distanceArray
+        that = np.full(len(self.distanceArray), UNREACHED, dtype=np.int32)
+        for c in other.getCells():
+            that[self.grid.indexOf(c)] = other.getDistanceTo(c)
+        return that
+
+    def _otherPallets(self, other):
+        if isinstance(other, ArrayDistances):
+            return other.pallets()
+        that = np.zeros(len(self.distanceArray), dtype=np.int32)
+        for c in other.getCells():
+            that[self.grid.indexOf(c)] = other.getPallet(c)
+        return that
+
+    def _combine(self, other, op, out):
+        """ op applied to the reached cells of self, cells unreached in
+        self or other become unreached """
+        mask = self.reached()
+        if isinstance(other, (numbers.Integral, np.integer)):
+            op(out, int(other), out=out, where=mask)
+        else:
+            that = self._otherArray(other)
+            mask &= that != UNREACHED
+            op(out, that, out=out, where=mask)
+        out[~mask] = UNREACHED
+        return out
+
+    def _copy(self):
+        palletArray = None if self.palletArray is None else self.palletArray.copy()
+        return ArrayDistances(self.rootCell, self.grid, self.distanceArray.copy(),
+                              rootPallet=self.rootPallet, palletArray=palletArray)
+
+    def __add__(self, other):
+        addition = self._copy()
+        self._combine(other, np.add, addition.distanceArray)
+        return addition
+
+    def __sub__(self, other):
+        difference = self._copy()
+        self._combine(other, np.subtract, difference.distanceArray)
+        return difference
+
+    def __iadd__(self, other):
+        self._combine(other, np.add, self._writable())
+        return self
+
+    def __isub__(self, other):
+        self._combine(other, np.subtract, self._writable())
+        return self
+
+    iadd = __iadd__
+    isub = __isub__
+
+    def minP(self, other):
+        """ cell by cell minimum; on a tie other's pallet wins only if it
+        is this pallet + 1, as Distances.minP """
+        this = self.distanceArray
+        that = self._otherArray(other)
+        thisPallet = self.pallets()
+        thatPallet = self._otherPallets(other)
+        thatReached = that != UNREACHED
+        takeThat = thatReached & (that < this)
+        tie = thatReached & (that == this) & ((thatPallet - thisPallet) == 1)
+        reached = self.reached()
+        minDistance = np.where(takeThat & reached, that, this)
+        pallets = np.where((takeThat | tie) & reached, thatPallet, thisPallet)
+        return ArrayDistances(self.rootCell, self.grid, minDistance.astype(np.int32),
+                              rootPallet=self.rootPallet,
+                              palletArray=pallets.astype(np.int32))
+
+    def max(self):
+        values = self.distanceArray[self.reached()]
+        if len(values) == 0:
+            return 0
+        return max(int(values.max()), 0)
+
+    def histogram(self):
+        """ number of cells at each distance 0 .. max() """
+        values = self.distanceArray[self.reached()]
+        if len(values) and values.min() < 0:
+            raise ValueError("histogram of negative distances")
+        return np.bincount(values, minlength=self.max() + 1)
@@ -0,0 +1,135 @@
+#!/usr/local/bin/python3
+# -*- coding: utf-8 -*-
+""" batch maze generation
+
+(C) 2017 Douglas Lange
+
+Makes count mazes of one algorithm and grid type, maze i from seed
+seed+i, and writes name_<i>.json, .svg and .utf8 for each.  Every maze
+is made with its own random.Random(seed+i), so the files are byte
+identical for a given seed whatever the number of workers.
+
+    python3 batchMazes.py RB --rows 44 --columns 56 --count 1000 --seed 7 --workers 8
+
+"""
+
+import argparse
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import InitMazes
+import PolarMazes
+from Mazes import Grid
+from PolarMazes import PolarGrid
+from compactGrid import CompactGrid
+from randomKruskalMaze import randomKruskalMaze
+
+GRID_TYPES = ("grid", "compact", "polar", "kruskal")
+FORMATS = ("json", "svg", "utf8")
+
+
+def makeMaze(gridType, algorithm, rows, columns, seed, radius=2):
+    """ one maze from seed, kruskal grids build their own weave maze
+    and ignore algorithm """
+    rng = random.Random(seed)
+    if gridType == "kruskal":
+        grid = randomKruskalMaze(rows, columns, rng=rng)
+        grid.manyRandomPassages()
+        grid.build()
+        # start and goal across the maze a third of the way down, the
+        # utf8 output prints the distances off the path
+        grid.start = grid.getCell(rows // 3, 0)
+        grid.goal = grid.getCell(rows // 3, columns - 1)
+        grid.distances = grid.getDistancesFromPath(grid.start, grid.goal)
+        return grid
+    if gridType == "polar":
+        grid = PolarGrid(radius, rows, columns)
+    elif gridType == "compact":
+        grid = CompactGrid(rows, columns)
+    else:
+        grid = Grid(rows, columns)
+    return InitMazes.initMaze(grid, algorithm, rng)
+
+
+def writeMaze(grid, gridType, baseName, formats):
+    if "json" in formats:
+        with open(baseName + ".json", "w", encoding="utf8") as fhj:
+            grid.dumpGrid(fhj)
+    if "svg" in formats:
+        if gridType == "polar":
+            grid.drawGrid(baseName)
+        else:
+            grid.writeSVG(baseName, inset=(gridType == "kruskal"))
+    if "utf8" in formats and gridType != "polar":
+        with open(baseName + ".utf8", "w", encoding="utf8") as fhp:
+            print(grid, file=fhp)
+
+
+def runJob(job):
+    """ make and write maze number index of a batch, job is a tuple so
+    it can be sent to a worker process """
+    gridType, algorithm, rows, columns, radius, seed, index, baseName, formats = job
+    grid = makeMaze(gridType, algorithm, rows, columns, seed, radius)
+    writeMaze(grid, gridType, baseName, formats)
+    return index, seed, baseName
+
+
+def batchJobs(gridType, algorithm, rows, columns, count, seed, outDir=".",
+              name="maze", formats=FORMATS, radius=2):
+    width = max(4, len(str(count - 1)))
+    return [(gridType, algorithm, rows, columns, radius, seed + i, i,
+             os.path.join(outDir, "%s_%0*d" % (name, width, i)), tuple(formats))
+            for i in range(count)]
+
+
+def runBatch(jobs, workers=1):
+    """ run the jobs, in worker processes when workers > 1, results in
+    job order """
+    if workers <= 1:
+        return [runJob(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(runJob, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="generate a batch of mazes")
+    parser.add_argument("algorithm", choices=sorted(InitMazes.MAZE_ALGORITHMS),
+                        help=", ".join(InitMazes.MAZE_ALGORITHMS_DESC))
+    parser.add_argument("--grid", choices=GRID_TYPES, default="grid")
+    parser.add_argument("--rows", type=int, default=44)
+    parser.add_argument("--columns", type=int, default=56,
+                        help="columns, or cells in the first ring of a polar grid")
+    parser.add_argument("--radius", type=int, default=2,
+                        help="radius of the first ring of a polar grid")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", default=".")
+    parser.add_argument("--name", default="maze")
+    parser.add_argument("--formats",
+                        help="comma separated, from %s, default all "
+                        "(no svg for polar grids without pycairo)" % ", ".join(FORMATS))
+    args = parser.parse_args(argv)
+    polarSVG = args.grid == "polar" and PolarMazes.cairo is None
+    if args.formats is None:
+        formats = [f for f in FORMATS if not (polarSVG and f == "svg")]
+    else:
+        formats = [f for f in args.formats.split(",") if f]
+    for f in formats:
+        if f not in FORMATS:
+            parser.error("unknown format %s" % f)
+    if polarSVG and "svg" in formats:
+        parser.error("svg output of polar grids needs pycairo")
+    if args.grid == "polar" and args.algorithm in InitMazes.RECTANGULAR_ALGORITHMS:
+        parser.error("%s needs a rectangular grid, not --grid polar"
+                     % InitMazes.MAZE_ALGORITHMS[args.algorithm])
+    os.makedirs(args.out, exist_ok=True)
+    jobs = batchJobs(args.grid, args.algorithm, args.rows, args.columns, args.count,
+                     args.seed, args.out, args.name, formats, args.radius)
+    for index, seed, baseName in runBatch(jobs, args.workers):
+        print(index, seed, baseName)
+
+
+if __name__ == "__main__":
+    main()
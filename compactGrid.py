@@ -0,0 +1,348 @@
+""" compact array backed rectangular grid
+
+(C) 2017 Douglas Lange
+
+A CompactGrid keeps no Cell objects.  The walls/links of every cell are
+held in one bytearray, one byte per cell of which the low nibble is used
+
+    bit 0  north
+    bit 1  east
+    bit 2  south
+    bit 3  west
+
+cells are addressed by flat integer index (row * columns + column).
+CompactCell objects are thin views created on demand so InitMazes,
+Distances and the cairo drawing code can use a CompactGrid like a Grid.
+Cell attributes (like 'EWpassage') are kept in a sparse dict keyed by index.
+
+"""
+
+import types
+import Mazes
+from Mazes import IndexedSet
+
+NORTH = 1
+EAST = 2
+SOUTH = 4
+WEST = 8
+
+LINK_BITS = {'north': NORTH, 'east': EAST, 'south': SOUTH, 'west': WEST}
+OPPOSITE_BITS = {NORTH: SOUTH, EAST: WEST, SOUTH: NORTH, WEST: EAST}
+DEAD_END_BITS = frozenset((NORTH, EAST, SOUTH, WEST))
+
+
+class _sparseAttributes(dict):
+    """ attribute dict of one cell, stored in the grid only once written,
+    every change is written back (an emptied dict is dropped) """
+
+    def __init__(self, store, index):
+        super().__init__(store.get(index, ()))
+        self.store = store
+        self.index = index
+
+    def _save(self):
+        if self:
+            self.store[self.index] = dict(self)
+        else:
+            self.store.pop(self.index, None)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._save()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._save()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._save()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._save()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._save()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._save()
+
+    def clear(self):
+        super().clear()
+        self._save()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+class CompactCell(Mazes.Cell):
+    """ view of one cell of a CompactGrid """
+
+    directions = ('north', 'east', 'south', 'west')
+
+    def __init__(self, grid, index):
+        self.myGrid = grid
+        self.index = index
+        self.row, self.column = divmod(index, grid.columns)
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactCell):
+            return NotImplemented
+        return self.index == other.index and self.myGrid is other.myGrid
+
+    def __hash__(self):
+        return self.index
+
+    @property
+    def nearby(self):
+        """ read only, the neighbors of a compact grid are fixed """
+        grid = self.myGrid
+        return types.MappingProxyType({d: grid.neighborCell(self.index, LINK_BITS[d])
+                                       for d in self.directions})
+
+    @property
+    def links(self):
+        """ read only, change links with link and unlink """
+        return types.MappingProxyType({cell: True for cell in self.getLinks()})
+
+    @property
+    def attributes(self):
+        return _sparseAttributes(self.myGrid.cellAttributes, self.index)
+
+    @attributes.setter
+    def attributes(self, value):
+        if value:
+            self.myGrid.cellAttributes[self.index] = dict(value)
+        else:
+            self.myGrid.cellAttributes.pop(self.index, None)
+
+    def link(self, cell, bidi=True):
+        """ links are link bits on both cells, so a compact link is
+        always both ways and bidi is ignored """
+        self.myGrid.linkIndices(self.index, cell.index)
+        return self
+
+    def unlink(self, cell, bidi=True):
+        """ always both ways, like link """
+        self.myGrid.unlinkIndices(self.index, cell.index)
+        return self
+
+    def getLinks(self):
+        grid = self.myGrid
+        bits = grid.linkBits[self.index]
+        return [grid.neighborCell(self.index, b)
+                for b in (NORTH, EAST, SOUTH, WEST) if bits & b]
+
+    def linked(self, cell):
+        if cell is None:
+            return False
+        bit = self.myGrid.directionBit(self.index, cell.index)
+        return bool(self.myGrid.linkBits[self.index] & bit)
+
+    def neighbors(self):
+        grid = self.myGrid
+        myNeighbors = [grid.neighborCell(self.index, b)
+                       for b in (NORTH, EAST, SOUTH, WEST)]
+        return [x for x in filter(None, myNeighbors)]
+
+    def getNeighbor(self, direction):
+        direction = self.directionToText(direction)
+        bit = LINK_BITS[direction]
+        if self.myGrid.linkBits[self.index] & bit:
+            return self.myGrid.neighborCell(self.index, bit)
+
+    def hasNeighbor(self, direction):
+        direction = self.directionToText(direction)
+        return bool(self.myGrid.linkBits[self.index] & LINK_BITS[direction])
+
+
+class _compactRow:
+    """ one row of a CompactGrid, indexable like a list of cells """
+
+    def __init__(self, grid, row):
+        self.grid = grid
+        self.start = row * grid.columns
+
+    def __len__(self):
+        return self.grid.columns
+
+    def __getitem__(self, column):
+        if not 0 <= column < self.grid.columns:
+            raise IndexError(column)
+        return CompactCell(self.grid, self.start + column)
+
+    def __iter__(self):
+        for i in range(self.start, self.start + self.grid.columns):
+            yield CompactCell(self.grid, i)
+
+
+class _compactRows:
+    """ rows of a CompactGrid, so grid.grid[row][column] keeps working """
+
+    def __init__(self, grid):
+        self.grid = grid
+
+    def __len__(self):
+        return self.grid.rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.grid.rows:
+            raise IndexError(row)
+        return _compactRow(self.grid, row)
+
+    def __iter__(self):
+        for row in range(self.grid.rows):
+            yield _compactRow(self.grid, row)
+
+
+class CompactGrid(Mazes.Grid):
+    """ rectangular grid storing links as one nibble per cell """
+
+    def __init__(self, rows, columns):
+        self.linkBits = bytearray(rows * columns)
+        self.cellAttributes = dict()   # key is cell index, value dict
+        super().__init__(rows, columns, cellClass=CompactCell)
+
+    def prepareGrid(self):
+        return _compactRows(self)
+
+    def configureCells(self):
+        pass
+
+    def eachCell(self):
+        for i in range(self.rows * self.columns):
+            yield CompactCell(self, i)
+
+    def getCell(self, row, column):
+        return CompactCell(self, row * self.columns + column)
+
+    def getNeighbor(self, row, column):
+        if not 0 <= row < self.rows:
+            return None
+        if not 0 <= column < self.columns:
+            return None
+        return CompactCell(self, row * self.columns + column)
+
+    def indexOf(self, cell):
+        return cell.index
+
+    def cellAt(self, index):
+        return CompactCell(self, index)
+
+    def neighborIndex(self, index, bit):
+        """ flat index of the neighbor in direction bit, or None at the edge """
+        columns = self.columns
+        if bit == NORTH:
+            return index - columns if index >= columns else None
+        if bit == SOUTH:
+            n = index + columns
+            return n if n < len(self.linkBits) else None
+        if bit == EAST:
+            return index + 1 if (index + 1) % columns else None
+        if bit == WEST:
+            return index - 1 if index % columns else None
+        raise ValueError("bad direction bit %r" % bit)
+
+    def neighborCell(self, index, bit):
+        n = self.neighborIndex(index, bit)
+        if n is None:
+            return None
+        return CompactCell(self, n)
+
+    def directionBit(self, index, other):
+        """ direction bit leading from index to the adjacent cell other """
+        columns = self.columns
+        if other == index - columns:
+            return NORTH
+        if other == index + columns:
+            return SOUTH
+        if other == index + 1 and other % columns:
+            return EAST
+        if other == index - 1 and index % columns:
+            return WEST
+        return 0
+
+    def linkIndices(self, a, b):
+        bit = self.directionBit(a, b)
+        if not bit:
+            raise ValueError("cells %d and %d are not adjacent" % (a, b))
+        self.linkBits[a] |= bit
+        self.linkBits[b] |= OPPOSITE_BITS[bit]
+        self.revision += 1
+        if self.deadEndSet is not None:
+            self.updateDeadEnd(a)
+            self.updateDeadEnd(b)
+
+    def unlinkIndices(self, a, b):
+        bit = self.directionBit(a, b)
+        if bit:
+            self.linkBits[a] &= ~bit & 0x0F
+            self.linkBits[b] &= ~OPPOSITE_BITS[bit] & 0x0F
+            self.revision += 1
+            if self.deadEndSet is not None:
+                self.updateDeadEnd(a)
+                self.updateDeadEnd(b)
+
+    def degree(self, index):
+        bits = self.linkBits[index]
+        return (bits & 1) + (bits >> 1 & 1) + (bits >> 2 & 1) + (bits >> 3 & 1)
+
+    def loadCellRecords(self, records):
+        """ restore links and attributes from dumpCell records """
+        columns = self.columns
+        linkBits = self.linkBits
+        for record in records:
+            row, column = record[0]
+            i = row * columns + column
+            bits = 0
+            for direction in record[1]:
+                bits |= LINK_BITS[direction]
+            linkBits[i] = bits
+            if len(record) > 2 and record[2]:
+                self.cellAttributes[i] = dict(record[2])
+        self.linksChanged()
+
+    def csrAdjacency(self, weighted=False):
+        """ links as CSR arrays straight from the link bits, a compact grid
+        has no tunnels so weights are all 1 """
+        import numpy as np
+        bits = np.frombuffer(self.linkBits, dtype=np.uint8)
+        n = len(bits)
+        i = np.arange(n, dtype=np.int64)
+        neighbors = np.stack((i - self.columns, i + 1, i + self.columns, i - 1), axis=1)
+        linked = (bits[:, None] & np.array([NORTH, EAST, SOUTH, WEST], dtype=np.uint8)) != 0
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(linked.sum(axis=1), out=indptr[1:])
+        indices = neighbors[linked].astype(np.int32)
+        weights = np.ones(len(indices), dtype=np.int32) if weighted else None
+        return indptr, indices, weights
+
+    def deadEndIndex(self):
+        """ IndexedSet of the indices of dead end cells, built from the
+        link bits on first use and kept up to date by linkIndices and
+        unlinkIndices """
+        if self.deadEndSet is None:
+            import numpy as np
+            bits = np.frombuffer(self.linkBits, dtype=np.uint8)
+            single = np.isin(bits, (NORTH, EAST, SOUTH, WEST))
+            self.deadEndSet = IndexedSet(np.flatnonzero(single).tolist())
+        return self.deadEndSet
+
+    def updateDeadEnd(self, index):
+        if self.linkBits[index] in DEAD_END_BITS:
+            self.deadEndSet.add(index)
+        else:
+            self.deadEndSet.discard(index)
+
+    def isDeadEnd(self, cell):
+        return cell.index in self.deadEndIndex()
+
+    def getDeadEndCells(self):
+        return [CompactCell(self, i) for i in self.deadEndIndex()]
@@ -104,7 +104,7 @@ class Distances:
         breadcrumbs = Distances(self.rootCell)
         breadcrumbs.setDistanceTo(current, self.cells[current])
 
-        while current is not self.rootCell:
+        while current != self.rootCell:
             for neighbor in current.getLinks():
                 if self.cells[neighbor] < self.cells[current]:
                     breadcrumbs.setDistanceTo(neighbor, self.cells[neighbor])
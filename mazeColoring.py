@@ -29,23 +29,48 @@ class mazeColoring:
         i = min(l-1, distanceValue)
         return self.pallet[i]
 
+    def lookupTable(self, maxDistance):
+        """ cellRGB of every distance 0 .. maxDistance for a cell that is
+        not special, so renderers can color by table lookup """
+        return [self.cellRGB(d, None) for d in range(maxDistance+1)]
+
 class myFirstMazeColloring(mazeColoring):
 
-    def cellRGB(self, distanceValue, Cell):
+    def palletIndex(self, distanceValue):
         norm = math.sqrt(self.grid.rows**2 + self.grid.columns**2)
         c = int(distanceValue * 3 / norm) +2
         if c > 7:
             c = 7
         if distanceValue == 0:
             c = 1
+        return c
+
+    def isDeadend(self, Cell):
+        """ a deadend whose only neighbor is a corridor gets pallet2,
+        dead ends are looked up in the grid's dead end index """
+        if self.grid.isDeadEnd(Cell):
+            for ncell in Cell.getLinks():
+                if len(ncell.getLinks()) == 2:
+                    return True
+        return False
+
+    def cellRGB(self, distanceValue, Cell):
+        c = self.palletIndex(distanceValue)
         hue = self.pallet[c]
         if distanceValue > 0:
-            if len(Cell.links) == 1:
-                for ncell in Cell.links.keys():
-                    if len(ncell.links) == 2:
-                        hue = self.pallet2[c]
+            if self.isDeadend(Cell):
+                hue = self.pallet2[c]
         return hue                          
 
+    def lookupTable(self, maxDistance):
+        return [self.pallet[self.palletIndex(d)] for d in range(maxDistance+1)]
+
+    def deadendLookupTable(self, maxDistance):
+        """ like lookupTable for cells where isDeadend is True """
+        table = [self.pallet2[self.palletIndex(d)] for d in range(maxDistance+1)]
+        table[0] = self.pallet[self.palletIndex(0)]
+        return table
+
 class distanceHistogram:
     
     def __init__(self, distance):
@@ -54,13 +79,17 @@ class distanceHistogram:
         
 
     def buildHisto(self,distance):
-        cnt = [0 for count in range(distance.max()+1)]
-        histoCells = distance.getCells()
-        ncells = 0
-        for c in histoCells:
-            ncells = ncells +1
-            this = distance.getDistanceTo(c)
-            cnt[this] = cnt[this] + 1
+        if hasattr(distance, 'histogram'):
+            cnt = [int(count) for count in distance.histogram()]
+            ncells = sum(cnt)
+        else:
+            cnt = [0 for count in range(distance.max()+1)]
+            histoCells = distance.getCells()
+            ncells = 0
+            for c in histoCells:
+                ncells = ncells +1
+                this = distance.getDistanceTo(c)
+                cnt[this] = cnt[this] + 1
         lessThan = 0
         for i in range(len(cnt)):
             self.cdf[i] = lessThan / ncells
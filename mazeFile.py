@@ -0,0 +1,231 @@
+""" compact binary maze files
+
+(C) 2017 Douglas Lange
+
+A binary maze file holds the same maze as a dumpGrid json file in about
+one byte per cell.  All numbers are little endian.
+
+    magic           8 bytes  b"MAZEBIN\0"
+    version         uint16
+    flags           uint16   (unused, 0)
+    header length   uint32
+    header          json: grid class, __init__ parameters, start, goal,
+                    cell count, cell directions and attributes other
+                    than the passage flags, padded with blanks to a
+                    multiple of 8 bytes
+    links           one byte per cell in flat index order, bit i set if
+                    the cell is linked to its neighbor in direction
+                    cell.directions[i], padded with zeros to 8 bytes
+    attributes      uint32 count, count uint32 cell indices, count flag
+                    bytes (1 EWpassage, 2 NSpassage)
+
+Weave tunnels are not stored, they follow from the passage attributes:
+a cell with NSpassage has its north and south neighbors linked to each
+other under it.  The link section is at a fixed offset so a file can be
+memory mapped and solved read only, see mapBinaryMaze.
+
+"""
+
+import json
+import mmap
+import struct
+
+MAGIC = b"MAZEBIN\0"
+VERSION = 1
+PREFIX = struct.Struct("<8sHHI")
+
+PASSAGE_FLAGS = {"EWpassage": 1, "NSpassage": 2}
+PASSAGE_DIRECTIONS = {"EWpassage": ('east', 'west'), "NSpassage": ('north', 'south')}
+
+
+def _pad8(n):
+    return (n + 7) & ~7
+
+
+def _location(cell):
+    if cell is None or not hasattr(cell, "row"):
+        return None
+    return [cell.row, cell.column]
+
+
+def saveBinaryMaze(grid, target):
+    """ write grid to target, a file name or a binary file """
+    if not hasattr(target, "write"):
+        with open(target, "wb") as f:
+            return saveBinaryMaze(grid, f)
+    if hasattr(grid, "linkBits"):
+        # a CompactGrid already holds the link section
+        links = bytes(grid.linkBits)
+        directions = list(grid.cellAt(0).directions)
+        attributeItems = sorted(grid.cellAttributes.items())
+    else:
+        cells = list(grid.eachCell())
+        directions = list(cells[0].directions)
+        links = bytearray(len(cells))
+        attributeItems = []
+        for cell in cells:
+            i = grid.indexOf(cell)
+            bits = 0
+            for k, d in enumerate(directions):
+                if cell.linked(cell.nearby.get(d)):
+                    bits |= 1 << k
+            links[i] = bits
+            if cell.attributes:
+                attributeItems.append((i, cell.attributes))
+        attributeItems.sort(key=lambda item: item[0])
+    indices = []
+    flags = bytearray()
+    otherAttributes = dict()
+    for i, attributes in attributeItems:
+        f = 0
+        other = dict()
+        for key, value in attributes.items():
+            if key in PASSAGE_FLAGS and value is True:
+                f |= PASSAGE_FLAGS[key]
+            else:
+                other[key] = value
+        if f:
+            indices.append(i)
+            flags.append(f)
+        if other:
+            otherAttributes[str(i)] = other
+    header = {"class": type(grid).__name__,
+              "parameters": grid.initParameters(),
+              "start": _location(grid.start),
+              "goal": _location(grid.goal),
+              "cells": len(links),
+              "directions": directions,
+              "attributes": otherAttributes}
+    headerBytes = json.dumps(header).encode("utf-8")
+    headerBytes = headerBytes + b" " * (_pad8(PREFIX.size + len(headerBytes))
+                                        - PREFIX.size - len(headerBytes))
+    target.write(PREFIX.pack(MAGIC, VERSION, 0, len(headerBytes)))
+    target.write(headerBytes)
+    target.write(links)
+    target.write(b"\0" * (_pad8(len(links)) - len(links)))
+    target.write(struct.pack("<I%dI" % len(indices), len(indices), *indices))
+    target.write(bytes(flags))
+
+
+class _sections:
+    """ offsets and decoded header of a binary maze in a buffer """
+
+    def __init__(self, buffer):
+        magic, version, flags, headerLength = PREFIX.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("not a binary maze file")
+        if version > VERSION:
+            raise ValueError("binary maze version %d is newer than %d" % (version, VERSION))
+        self.header = json.loads(bytes(buffer[PREFIX.size:PREFIX.size + headerLength]))
+        self.linkOffset = PREFIX.size + headerLength
+        n = self.header["cells"]
+        offset = self.linkOffset + _pad8(n)
+        count, = struct.unpack_from("<I", buffer, offset)
+        offset = offset + 4
+        indices = struct.unpack_from("<%dI" % count, buffer, offset)
+        flags = bytes(buffer[offset + 4 * count:offset + 5 * count])
+        self.passages = list(zip(indices, flags))
+        self.attributes = {int(i): a for i, a in self.header["attributes"].items()}
+        for i, f in self.passages:
+            attributes = self.attributes.setdefault(i, dict())
+            for key, bit in PASSAGE_FLAGS.items():
+                if f & bit:
+                    attributes[key] = True
+
+
+def loadBinaryMaze(source):
+    """ grid from a binary maze, source is a file name, a binary file,
+    bytes or a mmap """
+    if isinstance(source, str) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            return loadBinaryMaze(f.read())
+    if hasattr(source, "read") and not isinstance(source, mmap.mmap):
+        source = source.read()
+    from InitMazes import gridClassFromHeader
+    sections = _sections(source)
+    header = sections.header
+    grid = gridClassFromHeader(header["class"])(*header["parameters"])
+    n = header["cells"]
+    links = source[sections.linkOffset:sections.linkOffset + n]
+    if hasattr(grid, "linkBits"):
+        grid.linkBits[:] = links
+        grid.cellAttributes.update(sections.attributes)
+    else:
+        directions = header["directions"]
+        cells = [grid.cellAt(i) for i in range(n)]
+        for i, attributes in sections.attributes.items():
+            cell = cells[i]
+            cell.attributes = dict(attributes)
+            for key, (forward, back) in PASSAGE_DIRECTIONS.items():
+                if attributes.get(key):
+                    before = cell.nearby[back]
+                    after = cell.nearby[forward]
+                    before.nearby[forward] = after
+                    after.nearby[back] = before
+                    cell.nearby[forward] = None
+                    cell.nearby[back] = None
+        for i, bits in enumerate(links):
+            if bits:
+                cell = cells[i]
+                for k, d in enumerate(directions):
+                    if bits >> k & 1:
+                        cell.links[cell.nearby[d]] = True
+    grid.linksChanged()
+    if header["start"] is not None:
+        grid.start = grid.getCell(*header["start"])
+    if header["goal"] is not None:
+        grid.goal = grid.getCell(*header["goal"])
+    return grid
+
+
+class MappedMaze:
+    """ read only view of a memory mapped binary maze file """
+
+    def __init__(self, fileName):
+        self.file = open(fileName, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        sections = _sections(self.map)
+        self.header = sections.header
+        self.attributes = sections.attributes
+        self.passages = sections.passages
+        n = self.header["cells"]
+        self.links = memoryview(self.map)[sections.linkOffset:sections.linkOffset + n]
+
+    def close(self):
+        self.links.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def csrAdjacency(self):
+        """ CSR adjacency (indptr, indices, None) of a rectangular maze,
+        read straight from the mapped link bytes, for arrayDistances """
+        import numpy as np
+        if self.header["directions"] != ['north', 'east', 'south', 'west']:
+            raise ValueError("csrAdjacency needs a rectangular maze")
+        rows, columns = self.header["parameters"][:2]
+        bits = np.frombuffer(self.links, dtype=np.uint8)
+        n = len(bits)
+        i = np.arange(n, dtype=np.int64)
+        neighbors = np.stack((i - columns, i + 1, i + columns, i - 1), axis=1)
+        for here, f in self.passages:
+            if f & PASSAGE_FLAGS["NSpassage"]:
+                neighbors[here - columns, 2] = here + columns
+                neighbors[here + columns, 0] = here - columns
+            if f & PASSAGE_FLAGS["EWpassage"]:
+                neighbors[here + 1, 3] = here - 1
+                neighbors[here - 1, 1] = here + 1
+        linked = (bits[:, None] & np.array([1, 2, 4, 8], dtype=np.uint8)) != 0
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(linked.sum(axis=1), out=indptr[1:])
+        return indptr, neighbors[linked].astype(np.int32), None
+
+
+def mapBinaryMaze(fileName):
+    """ memory map a binary maze file for read only use """
+    return MappedMaze(fileName)
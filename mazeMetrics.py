@@ -0,0 +1,169 @@
+""" maze difficulty metrics
+
+(C) 2017 Douglas Lange
+
+mazeMetrics exports the links of a grid once (csrAdjacency, through the
+grid's DistanceCache so the start and goal fields are shared) and measures
+everything from that with NumPy: cell degrees give the dead end, junction,
+corridor and straightness counts, and three breadth first passes give the
+solution, the off path distances and the longest path.  All lengths count
+links.
+
+    cells               cells in the grid
+    solutionLength      links on the shortest path from start to goal
+    deadEnds            cells with one link
+    junctions           cells with three or more links
+    branchingFactor     junctions per cell
+    riverFactor         corridor cells (two links) per cell, high for mazes
+                        of long winding passages
+    straightness        corridor cells going straight through, per corridor
+                        cell, None for grids that are not rectangular
+    longestPath         links on the longest shortest path, found by double
+                        breadth first search (exact for perfect mazes)
+    maxOffPath          largest distance of a cell off the solution
+    offPathHistogram    number of cells at each distance off the solution
+
+solutionLength, maxOffPath and offPathHistogram are None when the goal
+cannot be reached from the start.
+
+Start and goal are the grid's when it has them, else the two ends of the
+longest path.  evaluateDirectory measures every saved maze (json or
+binary) in a directory.
+
+    python3 mazeMetrics.py mazes/ --workers 8
+
+"""
+
+import argparse
+import collections
+import glob
+import os
+import numpy as np
+import arrayDistances
+from arrayDistances import UNREACHED
+
+MazeMetrics = collections.namedtuple("MazeMetrics", [
+    "cells", "solutionLength", "deadEnds", "junctions", "branchingFactor",
+    "riverFactor", "straightness", "longestPath", "maxOffPath",
+    "offPathHistogram"])
+
+
+def farthest(dist):
+    """ index and distance of the farthest reached cell of a field """
+    reached = np.where(dist == UNREACHED, -1, dist)
+    i = int(np.argmax(reached))
+    return i, int(reached[i])
+
+
+def longestPath(indptr, indices, source=0, field=None):
+    """ (a, b, length) of the longest path by double breadth first search,
+    starting from source's component.  field(index) gives the distance
+    array from a cell, by default a breadth first pass over indptr and
+    indices, pass DistanceCache.field to share the passes """
+    if field is None:
+        def field(index):
+            return arrayDistances.bfsDistances(indptr, indices, index)
+    a, _ = farthest(field(source))
+    b, length = farthest(field(a))
+    return a, b, length
+
+
+def _straightCorridors(indptr, indices, degree, columns):
+    """ corridor cells whose two links are opposite, on a rectangular grid """
+    corridor = np.flatnonzero(degree == 2)
+    first = indices[indptr[corridor]].astype(np.int64)
+    second = indices[indptr[corridor] + 1].astype(np.int64)
+    straight = (first + second == 2 * corridor) & (np.abs(first - corridor) <= columns)
+    return int(np.count_nonzero(straight))
+
+
+def mazeMetrics(grid, start=None, goal=None):
+    """ MazeMetrics of grid, start and goal default to grid.start and
+    grid.goal, or the ends of the longest path """
+    cache = grid.getDistanceCache()
+    indptr, indices, _ = cache.adjacency()
+    n = len(indptr) - 1
+    degree = np.diff(indptr)
+    if start is None:
+        start = grid.start if grid.start else None
+    if goal is None:
+        goal = grid.goal if grid.goal else None
+    # the fields come from the cache, so the pass from start (or from a)
+    # is shared by the longest path and the solution: three passes
+    a, b, longest = longestPath(indptr, indices,
+                                grid.indexOf(start) if start is not None else 0,
+                                field=cache.field)
+    s = grid.indexOf(start) if start is not None else a
+    g = grid.indexOf(goal) if goal is not None else b
+    fromStart = cache.field(s)
+    solution = maxOffPath = histogram = None
+    if fromStart[g] != UNREACHED:
+        fromGoal = cache.field(g)
+        solution = int(fromStart[g])
+        reached = (fromStart != UNREACHED) & (fromGoal != UNREACHED)
+        # a cell k links off the path has dS + dG = solution + 2k in a tree
+        offPath = (fromStart[reached].astype(np.int64) + fromGoal[reached] - solution) // 2
+        counts = np.bincount(offPath)
+        maxOffPath = len(counts) - 1
+        histogram = tuple(int(c) for c in counts)
+    corridors = int(np.count_nonzero(degree == 2))
+    straightness = None
+    if hasattr(grid, "columns") and corridors:
+        straightness = _straightCorridors(indptr, indices, degree, grid.columns) / corridors
+    junctions = int(np.count_nonzero(degree >= 3))
+    return MazeMetrics(cells=n,
+                       solutionLength=solution,
+                       deadEnds=int(np.count_nonzero(degree == 1)),
+                       junctions=junctions,
+                       branchingFactor=junctions / n,
+                       riverFactor=corridors / n,
+                       straightness=straightness,
+                       longestPath=longest,
+                       maxOffPath=maxOffPath,
+                       offPathHistogram=histogram)
+
+
+def loadSavedMaze(fileName):
+    """ grid from a dumpGrid json file or a binary maze file """
+    import mazeFile
+    with open(fileName, "rb") as f:
+        magic = f.read(len(mazeFile.MAGIC))
+    if magic == mazeFile.MAGIC:
+        return mazeFile.loadBinaryMaze(fileName)
+    from InitMazes import loadMazeJson
+    return loadMazeJson(fileName)
+
+
+def metricsOfFile(fileName):
+    return fileName, mazeMetrics(loadSavedMaze(fileName))
+
+
+def evaluateDirectory(directory, patterns=("*.json", "*.maze"), workers=1):
+    """ [(file name, MazeMetrics)] of the saved mazes in directory, sorted
+    by file name, measured in worker processes when workers > 1 """
+    files = sorted(set(f for p in patterns for f in glob.glob(os.path.join(directory, p))))
+    if workers <= 1:
+        return [metricsOfFile(f) for f in files]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(metricsOfFile, files))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="difficulty metrics of saved mazes")
+    parser.add_argument("directory")
+    parser.add_argument("--pattern", action="append",
+                        help="file pattern, default *.json and *.maze")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+    patterns = args.pattern or ("*.json", "*.maze")
+    fields = [f for f in MazeMetrics._fields if f != "offPathHistogram"]
+    print(",".join(["file"] + fields))
+    for fileName, metrics in evaluateDirectory(args.directory, patterns, args.workers):
+        values = [getattr(metrics, f) for f in fields]
+        print(",".join([os.path.basename(fileName)] +
+                       ["%.4f" % v if isinstance(v, float) else str(v) for v in values]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+""" random sources for the maze generators
+
+(C) 2017 Douglas Lange
+
+Every generator takes an optional rng, any object with the random.Random
+methods random, randrange, randint, choice, shuffle and sample.  Pass a
+random.Random(seed) per maze to make mazes side by side reproducibly.
+
+BulkRandom has the same methods but draws from a NumPy Generator a
+block of numbers at a time, and adds uniforms, integers and permutation
+for code that wants whole arrays of random numbers at once.
+
+"""
+
+import numpy as np
+
+
+class BulkRandom:
+    """ random.Random like source filled in blocks from a NumPy Generator """
+
+    def __init__(self, seed=None, blockSize=1 << 16):
+        self.generator = np.random.default_rng(seed)
+        self.blockSize = blockSize
+        self.block = []
+        self.position = 0
+
+    def random(self):
+        if self.position == len(self.block):
+            self.block = self.generator.random(self.blockSize).tolist()
+            self.position = 0
+        u = self.block[self.position]
+        self.position = self.position + 1
+        return u
+
+    def randrange(self, start, stop=None):
+        if stop is None:
+            start, stop = 0, start
+        if stop <= start:
+            raise ValueError("empty range for randrange(%d, %d)" % (start, stop))
+        return start + int(self.random() * (stop - start))
+
+    def randint(self, a, b):
+        return self.randrange(a, b + 1)
+
+    def choice(self, seq):
+        if not len(seq):
+            raise IndexError("cannot choose from an empty sequence")
+        return seq[int(self.random() * len(seq))]
+
+    def shuffle(self, x):
+        order = self.generator.permutation(len(x)).tolist()
+        x[:] = [x[i] for i in order]
+
+    def sample(self, population, k):
+        population = list(population)
+        if not 0 <= k <= len(population):
+            raise ValueError("sample larger than population")
+        return [population[i] for i in self.generator.permutation(len(population))[:k].tolist()]
+
+    def uniforms(self, size):
+        """ float64 array of size uniforms in [0, 1) """
+        return self.generator.random(size)
+
+    def integers(self, low, high, size):
+        """ int64 array of size integers in [low, high) """
+        return self.generator.integers(low, high, size)
+
+    def permutation(self, n):
+        return self.generator.permutation(n)
@@ -4,12 +4,16 @@ Original by heyhuyen, Downloaded from Github, and highly
 modified to fit my classes.  Copyright (c) 2017 Douglas Lange
 """
 
-from random import shuffle, randrange, randint
+import random
 from Mazes import DistanceGrid, Cell, Distances
 
 class kruskalCell(Cell):
 
+    tunnelWeighted = True
+
     def getDistances(self, pallet=0):
+        if self.myGrid is not None:
+            return self.myGrid.distanceField(self, pallet)
         distances = Distances(self, rootPallet=pallet)
         frontier = []
         frontier.append(self)
@@ -27,28 +31,68 @@ class kruskalCell(Cell):
         return distances
 
 
+class DisjointSet:
+    """ union find forest with path compression and union by rank,
+    elements are the integers 0 .. n-1 """
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.rank = bytearray(n)
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        """ merge the sets holding a and b, False if already one set """
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if self.rank[a] == self.rank[b]:
+            self.rank[a] += 1
+        return True
+
+
 class randomKruskalMaze(DistanceGrid):
-    def __init__(self, rows, columns, cellClass=Cell):
+    def __init__(self, rows, columns, cellClass=Cell, rng=None):
         super().__init__(rows, columns, cellClass=Cell)   #may need Kruskal Cell class
-        self.sets = []
+        self.rng = rng               # random source, module random when None
+        self.sets = DisjointSet(rows*columns)   # keyed by cell index
         self.walls = []
+        self.removedWalls = set()    # (index, index) of walls opened by passages
         self.setup_sets_and_walls()
 
     def setup_sets_and_walls(self):
         for cell in self.eachCell():
-            self.sets.append(set([cell]))
             if cell.nearby.get('south'):
                 self.walls.append([cell, cell.nearby.get('south')])
             if cell.nearby.get('west'):
                 self.walls.append([cell, cell.nearby.get('west')])
 
-    def manyRandomPassages(self):
+    def randomSource(self, rng=None):
+        """ rng if given, else the grid's rng, else the module random """
+        if rng is not None:
+            return rng
+        if self.rng is not None:
+            return self.rng
+        return random
+
+    def manyRandomPassages(self, rng=None):
+        rng = self.randomSource(rng)
         many = (self.rows-2)*(self.columns-2)
         for i in range(0, many):
-            self.addRandomPassage()
+            self.addRandomPassage(rng)
 
-    def __RandomPassage(self,Start,End,XStart,XEnd,Here,Start_set,End_set,
-                        XStart_set,XEnd_set,Attribute,direction,Rdirection):
+    def __RandomPassage(self,Start,End,XStart,XEnd,Here,Attribute,direction,Rdirection):
         Start.nearby[direction] = End
         End.nearby[Rdirection] = Start
         Here.nearby[direction] = None
@@ -57,14 +101,17 @@ class randomKruskalMaze(DistanceGrid):
         XEnd.link(Here)
         Here.link(XStart)
         Here.attributes[Attribute] = True
-        self.walls.remove([Start, Here])
-        self.walls.remove([Here, End])
-        self.sets.append(Start_set.union(End_set))
-        self.sets.append(XStart_set.union(XEnd_set.union(set([Here]))))
-    
-    def addRandomPassage(self):
-        r = randrange(2, self.rows-1)
-        c = randrange(2, self.columns-1)
+        index = self.indexOf
+        self.removedWalls.add((index(Start), index(Here)))
+        self.removedWalls.add((index(Here), index(End)))
+        self.sets.union(index(Start), index(End))
+        self.sets.union(index(XStart), index(Here))
+        self.sets.union(index(XEnd), index(Here))
+
+    def addRandomPassage(self, rng=None):
+        rng = self.randomSource(rng)
+        r = rng.randrange(2, self.rows-1)
+        c = rng.randrange(2, self.columns-1)
         Here = self.grid[r][c]
         Used = len(Here.links)
         if not Used:
@@ -72,46 +119,33 @@ class randomKruskalMaze(DistanceGrid):
             East = self.grid[r][c+1]
             South = self.grid[r+1][c]
             West = self.grid[r][c-1]
-            for s in self.sets:
-                if North in s:
-                    N_set = s
-                if East in s:
-                    E_set = s
-                if South in s:
-                    S_set = s
-                if West in s:
-                    W_set = s
-            if N_set.isdisjoint(S_set) and W_set.isdisjoint(E_set):
-                self.sets.remove(N_set)
-                self.sets.remove(S_set)
-                self.sets.remove(E_set)
-                self.sets.remove(W_set)
-                self.sets.remove(set([Here]))
-                if randint(0, 1):
-                    self.__RandomPassage(North,South,East,West,Here,N_set,S_set,
-                                         E_set,W_set,"NSpassage",'south','north')
+            find = self.sets.find
+            N_set = find(self.indexOf(North))
+            E_set = find(self.indexOf(East))
+            S_set = find(self.indexOf(South))
+            W_set = find(self.indexOf(West))
+            # both passages must join different sets, and the over
+            # passage must not close a loop through the tunnel
+            if N_set != S_set and W_set != E_set and {N_set, S_set} != {E_set, W_set}:
+                if rng.randint(0, 1):
+                    self.__RandomPassage(North,South,East,West,Here,
+                                         "NSpassage",'south','north')
                 else:
-                    self.__RandomPassage(East,West,North,South,Here,E_set,W_set,
-                                         N_set,S_set,"EWpassage",'west','east')
- 
+                    self.__RandomPassage(East,West,North,South,Here,
+                                         "EWpassage",'west','east')
 
-    def build(self):
+    def build(self, rng=None):
+        rng = self.randomSource(rng)
+        if self.removedWalls:
+            index = self.indexOf
+            self.walls = [w for w in self.walls
+                          if (index(w[0]), index(w[1])) not in self.removedWalls]
+            self.removedWalls = set()
         wall_indices = [i for i in range(len(self.walls))]
-        shuffle(wall_indices)
+        rng.shuffle(wall_indices)
         for index in wall_indices:
             wall = self.walls[index]
             cell1 = wall[0]
             cell2 = wall[1]
-            for s in self.sets:              
-                if cell1 in s:
-                    a_set = s               
-                if cell2 in s:
-                    b_set = s
-            if a_set.isdisjoint(b_set):
+            if self.sets.union(self.indexOf(cell1), self.indexOf(cell2)):
                 cell1.link(cell2)
-                self.sets.append(a_set.union(b_set))
-                self.sets.remove(a_set)
-                self.sets.remove(b_set)
-
-
-
@@ -0,0 +1,222 @@
+""" raster rendering of rectangular mazes into a NumPy pixel buffer
+
+(C) 2017 Douglas Lange
+
+Draws the same picture as Grid.drawGrid / Grid.insetDrawGrid (weave mazes
+of randomKruskalMaze included) one pixel per point, so pointsPerCell
+pixels per cell.  Every fill and every 4 point wide wall line is an
+axis aligned rectangle relative to the cell corner, painted for all
+cells that need it at once with NumPy fancy indexing.  Coloring is
+looked up in mazeColoring.lookupTable by distance instead of calling
+cellRGB per cell, dead ends in deadendLookupTable through a mask made
+from the link flags of the band.  encodePNG writes the buffer as PNG with zlib only.
+
+"""
+
+import struct
+import zlib
+import numpy as np
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+
+def _cellArrays(grid, r0, r1):
+    """ per cell link and passage flags of rows r0 .. r1-1, by direction
+    north, east, south, west; tunnel flags for links that skip a cell """
+    columns = grid.columns
+    n = (r1 - r0) * columns
+    if hasattr(grid, "linkBits"):
+        bits = np.frombuffer(grid.linkBits, dtype=np.uint8)[r0*columns:r1*columns]
+        linked = [(bits & b) != 0 for b in (1, 2, 4, 8)]
+        tunnel = [np.zeros(n, dtype=bool) for b in range(4)]
+        passage = {"EWpassage": np.zeros(n, dtype=bool), "NSpassage": np.zeros(n, dtype=bool)}
+        for i, attributes in grid.cellAttributes.items():
+            if r0*columns <= i < r1*columns:
+                for key in passage:
+                    if attributes.get(key):
+                        passage[key][i - r0*columns] = True
+        return linked, tunnel, passage
+    linked = [np.zeros(n, dtype=bool) for b in range(4)]
+    tunnel = [np.zeros(n, dtype=bool) for b in range(4)]
+    passage = {"EWpassage": np.zeros(n, dtype=bool), "NSpassage": np.zeros(n, dtype=bool)}
+    directions = ("north", "east", "south", "west")
+    i = 0
+    for r in range(r0, r1):
+        for cell in grid.grid[r]:
+            for k, d in enumerate(directions):
+                neighbor = cell.getNeighbor(d)
+                if neighbor is not None:
+                    linked[k][i] = True
+                    if abs(neighbor.row - cell.row) + abs(neighbor.column - cell.column) > 1:
+                        tunnel[k][i] = True
+            for key in passage:
+                if cell.attributes.get(key):
+                    passage[key][i] = True
+            i = i + 1
+    return linked, tunnel, passage
+
+
+def colorTables(grid):
+    """ (lookup table, dead end lookup table or None) of grid.coloring as
+    (m, 3) uint8 arrays indexed by distance, made once per picture """
+    maxDistance = grid.distances.max()
+    table = _table(grid.coloring.lookupTable(maxDistance))
+    deadTable = None
+    if hasattr(grid.coloring, "deadendLookupTable"):
+        deadTable = _table(grid.coloring.deadendLookupTable(maxDistance))
+    return table, deadTable
+
+
+def _cellColors(grid, r0, r1, tables, linked, tunnel):
+    """ (n, 3) uint8 fill color of the cells of rows r0 .. r1-1, linked
+    and tunnel are their flags from _cellArrays """
+    columns = grid.columns
+    distances = grid.distances
+    if hasattr(distances, "distanceArray"):
+        d = distances.distanceArray[r0*columns:r1*columns].astype(np.int64)
+        d[~distances.reached()[r0*columns:r1*columns]] = 0
+    else:
+        d = np.array([distances.cells.get(cell, 0)
+                      for r in range(r0, r1) for cell in grid.grid[r]], dtype=np.int64)
+    d = np.maximum(d, 0)
+    table, deadTable = tables
+    colors = table[d]
+    if deadTable is not None:
+        mask = _deadendMask(grid, r0, linked, tunnel)
+        colors = np.where((mask & (d > 0))[:, None], deadTable[d], colors)
+    return colors
+
+
+def _deadendMask(grid, r0, linked, tunnel):
+    """ myFirstMazeColloring.isDeadend of the cells of rows r0 on from
+    their link flags: one link, to a cell with two links.  A link
+    leaving the rows or passing a tunnel is followed on the cell. """
+    columns = grid.columns
+    n = len(linked[0])
+    degree = sum(flags.astype(np.int8) for flags in linked)
+    mask = degree == 1
+    directions = ("north", "east", "south", "west")
+    for k, offset in enumerate((-columns, 1, columns, -1)):
+        ends = np.flatnonzero(mask & linked[k])
+        target = ends + offset
+        inside = (target >= 0) & (target < n) & ~tunnel[k][ends]
+        mask[ends[inside]] = degree[target[inside]] == 2
+        for i in ends[~inside].tolist():
+            cell = grid.grid[r0 + i // columns][i % columns]
+            mask[i] = len(cell.getNeighbor(directions[k]).getLinks()) == 2
+    return mask
+
+
+def _table(hues):
+    return np.array([[int(round(min(max(v, 0.0), 1.0) * 255)) for v in hue[:3]]
+                     for hue in hues], dtype=np.uint8)
+
+
+def _paint(img, top, left, rect, colors):
+    """ fill rect = (x0, y0, x1, y1), relative to each cell corner
+    (top, left), with one color or one color per cell """
+    if len(top) == 0:
+        return
+    x0, y0, x1, y1 = rect
+    ys = top[:, None] + np.arange(y0, y1)
+    xs = left[:, None] + np.arange(x0, x1)
+    colors = np.asarray(colors, dtype=np.uint8)
+    if colors.ndim == 2:
+        colors = colors[:, None, None, :]
+    img[ys[:, :, None], xs[:, None, :]] = colors
+
+
+def rasterizeGrid(grid, inset=False, rowRange=None, tables=None):
+    """ uint8 RGB image of grid as drawGrid (or insetDrawGrid) draws it
+
+    with rowRange = (r0, r1) only the pixel rows of those cell rows are
+    made, bands of consecutive ranges stack into the full image.  tables
+    is colorTables(grid), pass it when drawing band after band """
+    ppc = grid.pointsPerCell
+    width = grid.columns*ppc+8
+    height = grid.rows*ppc+8
+    r0, r1 = rowRange if rowRange is not None else (0, grid.rows)
+    y0 = 0 if r0 == 0 else 4 + r0*ppc
+    y1 = height if r1 == grid.rows else 4 + r1*ppc
+    # paint cells one row beyond the band into a padded buffer, lines and
+    # tunnels reach into the next cell
+    pad = ppc + 8
+    p0 = max(r0 - 1, 0)
+    p1 = min(r1 + 1, grid.rows)
+    img = np.empty((y1 - y0 + 2*pad, width + 2*pad, 3), dtype=np.uint8)
+    img[:] = WHITE
+    rows = np.repeat(np.arange(p0, p1), grid.columns)
+    columns = np.tile(np.arange(grid.columns), p1 - p0)
+    top = 4 + rows*ppc - y0 + pad
+    left = 4 + columns*ppc + pad
+    north, east, south, west = range(4)
+    linked, tunnel, passage = _cellArrays(grid, p0, p1)
+    colors = None
+    if grid.coloring is not None:
+        if tables is None:
+            tables = colorTables(grid)
+        colors = _cellColors(grid, p0, p1, tables, linked, tunnel)
+
+    def paint(mask, rect, color):
+        if not isinstance(color, tuple):
+            color = color[mask]
+        _paint(img, top[mask], left[mask], rect, color)
+
+    everyCell = np.ones(len(rows), dtype=bool)
+    if inset:
+        fill = colors if colors is not None else WHITE
+        paint(everyCell, (3, 3, ppc-3, ppc-3), fill)
+        for k, plain, through in ((east, (ppc-3, 3, ppc, ppc-3), (ppc-3, 3, ppc+3, ppc-3)),
+                                  (south, (3, ppc-3, ppc-3, ppc), (3, ppc-3, ppc-3, ppc+3)),
+                                  (west, (0, 3, 3, ppc-3), (-3, 3, 3, ppc-3)),
+                                  (north, (3, 0, ppc-3, 3), (3, -3, ppc-3, 3))):
+            paint(linked[k] & ~tunnel[k], plain, fill)
+            paint(linked[k] & tunnel[k], through, fill)
+        paint(~linked[east], (ppc-5, 1, ppc-1, ppc-1), BLACK)
+        paint(~linked[west], (1, 1, 5, ppc-1), BLACK)
+        ewWalls = linked[east] | passage["EWpassage"]
+        paint(ewWalls, (ppc-5, 1, ppc+5, 5), BLACK)
+        paint(ewWalls, (ppc-5, ppc-5, ppc+5, ppc-1), BLACK)
+        paint(~linked[south], (3, ppc-5, ppc-3, ppc-1), BLACK)
+        paint(~linked[north], (3, 1, ppc-3, 5), BLACK)
+        nsWalls = linked[south] | passage["NSpassage"]
+        paint(nsWalls, (1, ppc-5, 5, ppc+5), BLACK)
+        paint(nsWalls, (ppc-5, ppc-5, ppc-1, ppc+5), BLACK)
+    else:
+        if colors is not None:
+            paint(everyCell, (0, 0, ppc, ppc), colors)
+        paint(~linked[east] & (columns < grid.columns-1), (ppc-2, -2, ppc+2, ppc+2), BLACK)
+        paint(~linked[south] & (rows < grid.rows-1), (0, ppc-2, ppc, ppc+2), BLACK)
+        # border rectangle, a 4 point line around the cells
+        def box(x0, by0, x1, by1):
+            a = max(by0 - y0 + pad, 0)
+            b = min(by1 - y0 + pad, img.shape[0])
+            if a < b:
+                img[a:b, pad+x0:pad+x1] = BLACK
+        box(2, 2, 6, height-2)
+        box(width-6, 2, width-2, height-2)
+        box(2, 2, width-2, 6)
+        box(2, height-6, width-2, height-2)
+    return img[pad:pad + y1 - y0, pad:pad + width]
+
+
+def encodePNG(img, level=6):
+    """ PNG file contents of an (height, width, 3) uint8 image """
+    height, width = img.shape[:2]
+    raw = np.zeros((height, width*3 + 1), dtype=np.uint8)   # filter 0 per row
+    raw[:, 1:] = img.reshape(height, width*3)
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(raw.tobytes(), level)) +
+            chunk(b"IEND", b""))
+
+
+def writePNG(img, fileName, level=6):
+    with open(fileName, "wb") as f:
+        f.write(encodePNG(img, level))
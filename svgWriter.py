@@ -0,0 +1,217 @@
+""" cairo free SVG writer for rectangular mazes
+
+(C) 2017 Douglas Lange
+
+Writes the geometry of Grid.drawGrid / Grid.insetDrawGrid (Cell.fillRect,
+wallSegments, insetFillRects, insetWallSegments) to a buffered file as
+the cells are read, a band of rows at a time: one <path> per palette
+color and band, with a CSS class per color, and one <path> holding all
+walls with collinear runs merged.  Output may be gzipped (.svgz).
+
+"""
+
+import gzip
+import shutil
+import tempfile
+
+FILL_BAND_ROWS = 64     # rows of cells read (and filled per color) at a time
+
+
+def _hex(hue):
+    return "#%02x%02x%02x" % tuple(int(round(min(max(v, 0.0), 1.0) * 255)) for v in hue[:3])
+
+
+def _number(v):
+    return "%d" % v if v == int(v) else "%g" % v
+
+
+def _rectPath(rects):
+    for x, y, w, h in rects:
+        yield "M%s %sh%sv%sh-%sz" % (_number(x), _number(y), _number(w),
+                                     _number(h), _number(w))
+
+
+def _segmentPath(segments):
+    for x0, y0, x1, y1 in segments:
+        if y0 == y1:
+            yield "M%s %sH%s" % (_number(x0), _number(y0), _number(x1))
+        elif x0 == x1:
+            yield "M%s %sV%s" % (_number(x0), _number(y0), _number(y1))
+        else:
+            yield "M%s %sL%s %s" % (_number(x0), _number(y0), _number(x1), _number(y1))
+
+
+def _writePath(f, attributes, pieces, perLine=64):
+    path = _spooledPath(f, attributes, perLine)
+    next(path)
+    path.send(pieces)
+    path.close()
+
+
+def _spooledPath(f, attributes, perLine=64):
+    """ coroutine writing one <path> to f, send it batches of path pieces
+    as they are made and close it to end the path """
+    f.write('<path %s d="' % attributes)
+    line = []
+    try:
+        while True:
+            pieces = yield
+            for piece in pieces:
+                line.append(piece)
+                if len(line) == perLine:
+                    f.write("".join(line))
+                    f.write("\n")
+                    line = []
+    except GeneratorExit:
+        f.write("".join(line))
+        f.write('"/>\n')
+
+
+class _SegmentMerger:
+    """ mergeSegments for segments arriving a band of rows at a time, so
+    only the wall runs that can still grow are held.  finish(limit)
+    returns the merged runs no segment with y >= limit can extend, all
+    of them when limit is None. """
+
+    def __init__(self):
+        self.horizontal = dict()
+        self.vertical = dict()
+        self.other = []
+
+    def add(self, segments):
+        for x0, y0, x1, y1 in segments:
+            if y0 == y1:
+                self.horizontal.setdefault(y0, []).append((min(x0, x1), max(x0, x1)))
+            elif x0 == x1:
+                self.vertical.setdefault(x0, []).append((min(y0, y1), max(y0, y1)))
+            else:
+                self.other.append((x0, y0, x1, y1))
+
+    def finish(self, limit=None):
+        merged = self.other
+        self.other = []
+        for y in sorted(self.horizontal):
+            if limit is None or y < limit:
+                merged.extend((a, y, b, y) for a, b in _mergeRuns(self.horizontal.pop(y)))
+        for x in sorted(self.vertical):
+            runs = _mergeRuns(self.vertical.pop(x))
+            if limit is not None:
+                pending = [(a, b) for a, b in runs if b >= limit]
+                if pending:
+                    self.vertical[x] = pending
+                    runs = [(a, b) for a, b in runs if b < limit]
+            merged.extend((x, a, x, b) for a, b in runs)
+        return merged
+
+
+def _mergeRuns(runs):
+    runs = sorted(runs)
+    merged = []
+    start, end = runs[0]
+    for a, b in runs[1:]:
+        if a <= end:
+            end = max(end, b)
+        else:
+            merged.append((start, end))
+            start, end = a, b
+    merged.append((start, end))
+    return merged
+
+
+def writeGridSVG(grid, fileName, inset=False, compress=False, openings=(),
+                 rowRange=None, bandRows=FILL_BAND_ROWS):
+    """ draw grid like drawGrid (or insetDrawGrid when inset) into the SVG
+    file fileName, gzipped when compress.  openings are border cells in
+    the first or last column to open like Grid.drawOpening.  With
+    rowRange = (r0, r1) only the band of those cell rows is drawn.
+
+    Cells are read bandRows rows at a time: each band's fills go out as
+    one path per color and finished wall runs are written as they are
+    merged, both to temporary files copied behind the header at the end,
+    so memory stays at a band of cells whatever the maze size. """
+    pointsPerCell = grid.pointsPerCell
+    width = grid.columns*pointsPerCell+8
+    height = grid.rows*pointsPerCell+8
+    if rowRange is None:
+        r0, r1 = 0, grid.rows
+        y0, y1 = 0, height
+        p0, p1 = r0, r1
+    else:
+        r0, r1 = rowRange
+        y0 = 0 if r0 == 0 else 4 + r0*pointsPerCell
+        y1 = height if r1 == grid.rows else 4 + r1*pointsPerCell
+        # lines of the rows next to the band reach into it
+        p0, p1 = max(r0 - 1, 0), min(r1 + 1, grid.rows)
+    classes = dict()
+    merger = _SegmentMerger()
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as fillFile, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as wallFile:
+        walls = _spooledPath(wallFile, 'class="w"')
+        next(walls)
+        for b0 in range(p0, p1, bandRows):
+            b1 = min(b0 + bandRows, p1)
+            fills = dict()
+            for r in range(b0, b1):
+                for cell in grid.grid[r]:
+                    if grid.coloring is not None:
+                        d = grid.distances.cells.get(cell, 0)
+                        hue = _hex(grid.coloring.cellRGB(d, cell))
+                    elif inset:
+                        hue = "#ffffff"
+                    else:
+                        hue = None
+                    if inset:
+                        fills.setdefault(hue, []).extend(cell.insetFillRects(pointsPerCell))
+                        merger.add(cell.insetWallSegments(pointsPerCell))
+                    else:
+                        if hue is not None:
+                            fills.setdefault(hue, []).append(cell.fillRect(pointsPerCell))
+                        merger.add(cell.wallSegments(pointsPerCell, grid.rows, grid.columns))
+            for color in sorted(fills):
+                if color not in classes:
+                    classes[color] = "c%d" % len(classes)
+                _writePath(fillFile, 'class="%s"' % classes[color], _rectPath(fills[color]))
+            # no segment of a later row starts above its top less 2
+            walls.send(_segmentPath(merger.finish(4 + b1*pointsPerCell - 2
+                                                  if b1 < p1 else None)))
+        walls.close()
+        if compress:
+            f = gzip.open(fileName, "wt", encoding="utf-8")
+        else:
+            f = open(fileName, "w", encoding="utf-8", buffering=1 << 16)
+        with f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            f.write('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" '
+                    'viewBox="0 %d %d %d">\n' % (width, y1 - y0, y0, width, y1 - y0))
+            f.write("<style>\n.w{fill:none;stroke:#000;stroke-width:4;"
+                    "stroke-linecap:butt;stroke-linejoin:miter}\n")
+            for color, name in classes.items():
+                f.write(".%s{fill:%s}\n" % (name, color))
+            f.write("</style>\n")
+            if inset:
+                f.write('<rect x="4" y="4" width="%d" height="%d" fill="#fff"/>\n'
+                        % (grid.columns*pointsPerCell, grid.rows*pointsPerCell))
+            for spool in (fillFile, wallFile):
+                spool.seek(0)
+                shutil.copyfileobj(spool, f)
+            if not inset:
+                f.write('<rect class="w" x="4" y="4" width="%d" height="%d"/>\n'
+                        % (grid.columns*pointsPerCell, grid.rows*pointsPerCell))
+            for cell in openings:
+                if not r0 <= cell.row < r1:
+                    continue
+                if grid.coloring is None:
+                    hue = "#ffffff"
+                else:
+                    hue = _hex(grid.coloring.cellRGB(0, cell))
+                top = 4+2+(cell.row*pointsPerCell)
+                bottom = 4-2+((cell.row+1)*pointsPerCell)
+                if cell.column == 0:
+                    x = 4
+                elif cell.column == grid.columns - 1:
+                    x = grid.columns*pointsPerCell+4
+                else:
+                    continue
+                f.write('<path d="M%d %dV%d" stroke="%s" stroke-width="4"/>\n'
+                        % (x, top, bottom, hue))
+            f.write("</svg>\n")
@@ -0,0 +1,44 @@
+""" checks of the batchMazes command line
+
+(C) 2017 Douglas Lange
+
+    python3 -m unittest test_batchMazes
+
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import batchMazes
+
+
+class polarArgumentsTest(unittest.TestCase):
+
+    def runMain(self, argv):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as exit:
+            batchMazes.main(argv)
+        return exit.exception.code, stderr.getvalue()
+
+    def testRectangularAlgorithmsRejectPolar(self):
+        for algorithm in ("BT", "S"):
+            with tempfile.TemporaryDirectory() as outDir:
+                code, message = self.runMain([algorithm, "--grid", "polar", "--formats", "json",
+                                              "--out", outDir, "--workers", "1"])
+                self.assertEqual(code, 2)
+                self.assertIn("needs a rectangular grid", message)
+                self.assertEqual(os.listdir(outDir), [])
+
+    def testPolarBacktracker(self):
+        with tempfile.TemporaryDirectory() as outDir:
+            with contextlib.redirect_stdout(io.StringIO()):
+                batchMazes.main(["RB", "--grid", "polar", "--rows", "4", "--columns", "6",
+                                 "--formats", "json", "--out", outDir, "--workers", "1"])
+            self.assertEqual(os.listdir(outDir), ["maze_0000.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+""" tiled rendering of rectangular mazes too big for one picture
+
+(C) 2017 Douglas Lange
+
+The grid is drawn in bands of cell rows with rasterRender.rasterizeGrid
+(or svgWriter.writeGridSVG), so only one band of pixels is held at a
+time.  renderDeepZoom cuts the bands into tileSize square PNG tiles of a
+Deep Zoom pyramid:
+
+    name.dzi                    Deep Zoom descriptor (the tile index)
+    name_files/<level>/<column>_<row>.png
+
+Level maxLevel is full size, every level below is half the size of the
+one above down to 1 x 1 pixel at level 0.  Each level keeps less than
+one tile row of pixels plus the band it is handed, and passes pairs of
+pixel rows averaged 2 x 2 to the level below as they come.
+
+renderSVGBands writes one SVG fragment per band and a json index of them.
+
+"""
+
+import json
+import math
+import os
+import numpy as np
+import rasterRender
+import svgWriter
+
+
+def _downsample(rows):
+    """ half size of an even number of pixel rows, averaging 2 x 2 blocks """
+    if rows.shape[1] % 2:
+        rows = np.concatenate((rows, rows[:, -1:]), axis=1)
+    h, w = rows.shape[0] // 2, rows.shape[1] // 2
+    blocks = rows.reshape(h, 2, w, 2, 3).astype(np.uint16)
+    return ((blocks.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8)
+
+
+class _pyramidLevel:
+    """ one level of the pyramid, cuts the pixel rows it is given into
+    tiles and hands them on halved to the level below """
+
+    def __init__(self, level, folder, tileSize, below, compression=6):
+        self.level = level
+        self.folder = os.path.join(folder, str(level))
+        self.tileSize = tileSize
+        self.below = below
+        self.compression = compression
+        self.pending = None
+        self.carry = None
+        self.tileRow = 0
+        self.tiles = 0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def push(self, rows):
+        if self.pending is None:
+            self.pending = rows
+        else:
+            self.pending = np.concatenate((self.pending, rows))
+        while len(self.pending) >= self.tileSize:
+            self.writeTileRow(self.pending[:self.tileSize])
+            self.pending = self.pending[self.tileSize:]
+        if self.below is not None:
+            if self.carry is not None:
+                rows = np.concatenate((self.carry, rows))
+                self.carry = None
+            if len(rows) % 2:
+                self.carry = rows[-1:]
+                rows = rows[:-1]
+            if len(rows):
+                self.below.push(_downsample(rows))
+
+    def writeTileRow(self, rows):
+        size = self.tileSize
+        for c in range(0, rows.shape[1], size):
+            tile = np.ascontiguousarray(rows[:, c:c + size])
+            name = os.path.join(self.folder, "%d_%d.png" % (c // size, self.tileRow))
+            rasterRender.writePNG(tile, name, self.compression)
+            self.tiles = self.tiles + 1
+        self.tileRow = self.tileRow + 1
+
+    def finish(self):
+        if self.pending is not None and len(self.pending):
+            self.writeTileRow(self.pending)
+        self.pending = None
+        if self.below is not None:
+            if self.carry is not None:
+                self.below.push(_downsample(np.concatenate((self.carry, self.carry))))
+                self.carry = None
+            self.below.finish()
+
+
+def bandRanges(grid, bandRows):
+    """ (r0, r1) cell row ranges of bandRows rows covering grid """
+    return [(r0, min(r0 + bandRows, grid.rows)) for r0 in range(0, grid.rows, bandRows)]
+
+
+def renderDeepZoom(grid, name, tileSize=256, inset=False, bandRows=None, level=6):
+    """ draw grid as a Deep Zoom pyramid of PNG tiles, name.dzi and
+    name_files/, returns the number of tiles written """
+    ppc = grid.pointsPerCell
+    width = grid.columns*ppc+8
+    height = grid.rows*ppc+8
+    if bandRows is None:
+        bandRows = max(1, tileSize // ppc)
+    maxLevel = int(math.ceil(math.log2(max(width, height))))
+    folder = name + "_files"
+    below = None
+    levels = []
+    for n in range(maxLevel + 1):
+        below = _pyramidLevel(n, folder, tileSize, below, level)
+        levels.append(below)
+    top = levels[-1]
+    tables = rasterRender.colorTables(grid) if grid.coloring is not None else None
+    for rowRange in bandRanges(grid, bandRows):
+        top.push(rasterRender.rasterizeGrid(grid, inset=inset, rowRange=rowRange,
+                                            tables=tables))
+    top.finish()
+    with open(name + ".dzi", "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008"\n'
+                '       TileSize="%d" Overlap="0" Format="png">\n'
+                '  <Size Width="%d" Height="%d"/>\n'
+                '</Image>\n' % (tileSize, width, height))
+    return sum(l.tiles for l in levels)
+
+
+def renderSVGBands(grid, name, bandRows=64, inset=False, compress=False):
+    """ draw grid as SVG fragments of bandRows cell rows each,
+    name_<band>.svg (.svgz when compress), indexed in name_bands.json """
+    ppc = grid.pointsPerCell
+    height = grid.rows*ppc+8
+    bands = []
+    for k, (r0, r1) in enumerate(bandRanges(grid, bandRows)):
+        fileName = "%s_%d.%s" % (name, k, "svgz" if compress else "svg")
+        svgWriter.writeGridSVG(grid, fileName, inset=inset, compress=compress,
+                               rowRange=(r0, r1))
+        y0 = 0 if r0 == 0 else 4 + r0*ppc
+        y1 = height if r1 == grid.rows else 4 + r1*ppc
+        bands.append({"file": os.path.basename(fileName), "rows": [r0, r1],
+                      "y": y0, "height": y1 - y0})
+    index = {"width": grid.columns*ppc+8, "height": height, "bands": bands}
+    with open(name + "_bands.json", "w") as f:
+        json.dump(index, f, indent=1)
+    return index
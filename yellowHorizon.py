@@ -16,13 +16,9 @@ def main():
     grid = randomKruskalMaze(rows, columns)
     grid.manyRandomPassages()
     grid.build()
-    startRow = 14
-    startColumn = 0
-    grid.start = grid.getCell(startRow, startColumn)
-    goalRow = 14
-    goalColumn = columns-1
-    grid.goal = grid.getCell(goalRow, goalColumn)
-    grid.distances = grid.getDistancesFromPath(grid.start, grid.goal)
+    # start and goal at the ends of the longest path between edge cells
+    fields = grid.findDiameter(border=True)
+    grid.distances = grid.getDistancesFromPath(grid.start, grid.goal, fields=fields)
     p = interpolatePallet(YlOrRd_9.mpl_colors, grid.distances)
     grid.coloring = mazeColoring(grid, p)
     printFile = nameForFiles + ".utf8"